@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Compare CPU use of the inotify and polling DirWatcher backends.
+
+The polling interval backs off as the number of files grows, so idle CPU of the
+polling backend is measured at its backed off interval.
+
+Usage: python dir_watcher_bench.py [--files 10000 100000] [--idle 30]
+"""
+
+import argparse
+import collections
+import os
+import shutil
+import tempfile
+import time
+
+from wandb.filesync import dir_watcher
+
+Settings = collections.namedtuple(
+    "Settings", "files_dir ignore_globs file_quiescence file_watcher"
+)
+
+
+class NullFilePusher(object):
+    def file_changed(self, save_name, path, copy=True):
+        pass
+
+
+def cpu_time():
+    t = os.times()
+    return t.user + t.system
+
+
+def bench(backend, num_files, idle_seconds):
+    files_dir = tempfile.mkdtemp("-wandb-bench")
+    watcher = dir_watcher.DirWatcher(
+        Settings(files_dir, [], None, backend), None, NullFilePusher()
+    )
+    assert watcher.polling == (backend == "polling")
+
+    start = cpu_time()
+    for i in range(num_files):
+        subdir = os.path.join(files_dir, "media", str(i // 1000))
+        if i % 1000 == 0:
+            os.makedirs(subdir)
+        with open(os.path.join(subdir, "%i.png" % i), "w") as f:
+            f.write("x")
+    # let the watcher catch up with the events from the writes
+    time.sleep(5)
+    write_cpu = cpu_time() - start
+
+    start = cpu_time()
+    time.sleep(idle_seconds)
+    idle_cpu = cpu_time() - start
+
+    start = time.time()
+    watcher.finish()
+    finish_secs = time.time() - start
+    shutil.rmtree(files_dir)
+    print(
+        "%-8s %7i files: write %6.2fs cpu, idle %6.2fs cpu / %is, finish %6.2fs"
+        % (backend, num_files, write_cpu, idle_cpu, idle_seconds, finish_secs)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--idle", type=int, default=30)
+    args = parser.parse_args()
+    backends = ["polling"]
+    if dir_watcher.wd_inotify is not None:
+        backends.insert(0, "inotify")
+    for num_files in args.files:
+        for backend in backends:
+            bench(backend, num_files, args.idle)
+
+
+if __name__ == "__main__":
+    main()
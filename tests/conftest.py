@@ -273,6 +273,16 @@ def local_settings(mocker):
         yield
 
 
+@pytest.fixture(autouse=True)
+def hash_cache(tmp_path, monkeypatch):
+    """Keep artifact file digests out of the real cache dir"""
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    cache = artifacts.HashCache(str(tmp_path / "hashes.db"))
+    monkeypatch.setattr(artifacts, "_hash_cache", cache)
+    yield cache
+    cache.close()
+
+
 @pytest.fixture
 def mock_server(mocker):
     return utils.mock_server(mocker)
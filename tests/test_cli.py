@@ -276,6 +276,12 @@ def test_artifact_upload(runner, git_repo, mock_server, mocker, mocked_run):
     assert "test/simple:v0" in result.output
 
 
+def test_artifact_verify(runner, git_repo, mock_server):
+    result = runner.invoke(cli.artifact, ["verify", "test/mnist:v0"])
+    assert result.exit_code == 1
+    assert "digits.h5: missing" in result.output
+
+
 def test_artifact_ls(runner, git_repo, mock_server):
     result = runner.invoke(cli.artifact, ["ls", "test"])
     print(result.output)
@@ -286,6 +292,19 @@ def test_artifact_ls(runner, git_repo, mock_server):
     assert "mnist:v2" in result.output
 
 
+def test_artifact_cache_cleanup(runner, mocker):
+    artifacts_cache = mocker.Mock()
+    artifacts_cache.cleanup.return_value = 2048
+    mocker.patch(
+        "wandb.wandb_sdk.interface.artifacts.get_artifacts_cache",
+        return_value=artifacts_cache,
+    )
+    result = runner.invoke(cli.artifact, ["cache", "cleanup", "--target-size", "1GB"])
+    assert result.exit_code == 0
+    artifacts_cache.cleanup.assert_called_once_with(1024 ** 3)
+    assert "Reclaimed 2.0KiB of space" in result.output
+
+
 def test_docker_run_digest(runner, docker, monkeypatch):
     result = runner.invoke(cli.docker_run, [DOCKER_SHA],)
     assert result.exit_code == 0
@@ -7,6 +7,8 @@ import os
 import six
 import sys
 import glob
+import threading
+import time
 import platform
 import pandas as pd
 from click.testing import CliRunner
@@ -633,6 +635,39 @@ def test_table_from_pandas():
     assert table.data == table_data
 
 
+def test_table_native_columns():
+    pd_data = pd.DataFrame(
+        {"a": [1, 2], "b": [0.5, None], "c": ["x", None], "d": [True, False]}
+    )
+    table = wandb.Table(dataframe=pd_data)
+    assert table._native_columns is not None
+    assert table._to_table_json(max_rows=1)["data"] == [[1, 0.5, "x", True]]
+    assert table._native_columns is not None
+    list_table = wandb.Table(
+        columns=["a", "b", "c", "d"], data=[[1, 0.5, "x", True], [2, None, None, False]]
+    )
+    assert table._column_types == list_table._column_types
+    table.add_data(3, 1.5, "y", True)
+    assert table._native_columns is None
+    assert table.data[0] == [1, 0.5, "x", True]
+    assert len(table.data) == 3
+
+    with pytest.raises(TypeError):
+        wandb.Table(columns=["a", "b"], data=np.array([[1, 2]]), dtype=str)
+
+
+def test_table_native_columns_copied():
+    ndarray = np.array([[1, 2], [3, 4]])
+    table = wandb.Table(columns=["a", "b"], data=ndarray)
+    ndarray[0, 0] = 10
+    pd_data = pd.DataFrame({"a": [1, 3], "b": [2, 4]})
+    pd_table = wandb.Table(dataframe=pd_data)
+    pd_data.iloc[0, 0] = 10
+    pd_data["b"].values[1] = 40
+    assert table.data == [[1, 2], [3, 4]]
+    assert pd_table.data == [[1, 2], [3, 4]]
+
+
 def test_graph():
     graph = wandb.Graph()
     node_a = data_types.Node("a", "Node A", size=(4,))
@@ -666,6 +701,84 @@ def test_partitioned_table_from_json(runner, mock_server, api):
         assert row == data[ndx]
 
 
+class FakePartEntry(object):
+    def __init__(self, ndx, loaded, size=10):
+        self.entry = wandb.wandb_sdk.interface.artifacts.ArtifactManifestEntry(
+            "parts/%i.table.json" % ndx, None, "digest", size=size
+        )
+        self.ndx = ndx
+        self.loaded = loaded
+
+    def load_part(self):
+        self.loaded.add(self.ndx)
+        self.max_loaded = len(self.loaded)
+        return wandb.Table(columns=["a"], data=[[self.ndx], [self.ndx]])
+
+    def free(self):
+        self.loaded.discard(self.ndx)
+
+
+def test_partitioned_table_prefetch():
+    loaded = set()
+    ptable = wandb.data_types.PartitionedTable(parts_path="parts")
+    parts = [FakePartEntry(i, loaded) for i in range(5)]
+    ptable._loaded_part_entries = {str(i): part for i, part in enumerate(parts)}
+    rows = list(ptable.iterrows(prefetch=1))
+    assert rows == [(i, [i // 2]) for i in range(10)]
+    assert loaded == set()
+    assert max(part.max_loaded for part in parts) <= 2
+
+    # parts over the memory budget are only fetched once the previous is read
+    rows = list(ptable.iterrows(prefetch=3, max_prefetch_bytes=5))
+    assert len(rows) == 10
+    assert max(part.max_loaded for part in parts) == 1
+
+
+def test_partitioned_table_prefetch_break():
+    release = threading.Event()
+
+    class SlowPartEntry(FakePartEntry):
+        def load_part(self):
+            if self.ndx > 0:
+                release.wait(10)
+            return super(SlowPartEntry, self).load_part()
+
+    loaded = set()
+    ptable = wandb.data_types.PartitionedTable(parts_path="parts")
+    parts = [SlowPartEntry(i, loaded) for i in range(3)]
+    ptable._loaded_part_entries = {str(i): part for i, part in enumerate(parts)}
+    start = time.time()
+    for ndx, row in ptable.iterrows(prefetch=2):
+        break
+    # the parts still loading are left to finish in the background
+    assert time.time() - start < 5
+    release.set()
+
+
+def test_partitioned_table_decodes_in_background(mocker):
+    decoded_in = []
+
+    def load_columnar(self, columnar, source_artifact):
+        decoded_in.append(threading.current_thread())
+        return [[1, 2]]
+
+    mocker.patch.object(wandb.Table, "_load_columnar", load_columnar)
+
+    class SourceArtifact(object):
+        def get(self, path):
+            table = wandb.Table(columns=["a"])
+            table._columnar_source = ({}, self)
+            return table
+
+    ptable = wandb.data_types.PartitionedTable(parts_path="parts")
+    entry = wandb.wandb_sdk.interface.artifacts.ArtifactManifestEntry(
+        "parts/0.table.json", None, "digest"
+    )
+    ptable._add_part_entry(entry, SourceArtifact())
+    assert list(ptable.iterrows()) == [(0, [1]), (1, [2])]
+    assert decoded_in and decoded_in[0] is not threading.current_thread()
+
+
 def test_partitioned_table():
     partition_table = wandb.data_types.PartitionedTable(parts_path="parts")
     assert len([(ndx, row) for ndx, row in partition_table.iterrows()]) == 0
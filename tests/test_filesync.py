@@ -0,0 +1,354 @@
+"""filesync tests."""
+
+import collections
+import os
+import time
+
+from six.moves import queue
+import pytest
+import wandb
+from wandb.compat import tempfile
+from wandb.filesync import bandwidth
+from wandb.filesync import dir_watcher
+from wandb.filesync import stats
+from wandb.filesync import step_checksum
+from wandb.filesync import step_upload
+
+
+@pytest.fixture
+def checksum_step():
+    request_queue = queue.Queue()
+    output_queue = queue.Queue()
+    step = step_checksum.StepChecksum(
+        None,
+        tempfile.TemporaryDirectory("wandb"),
+        request_queue,
+        output_queue,
+        stats.Stats(),
+    )
+    step.start()
+    yield step, request_queue, output_queue
+    if step.is_alive():
+        step.finish()
+
+
+def drain(output_queue):
+    events = []
+    while True:
+        event = output_queue.get(timeout=5)
+        if isinstance(event, step_upload.RequestFinish):
+            return events
+        events.append(event)
+
+
+def upload_request(path, save_name, copy=True):
+    return step_checksum.RequestUpload(path, save_name, None, copy, False, None, None)
+
+
+def test_snapshot_file(tmpdir):
+    src = str(tmpdir.join("src.txt"))
+    dst = str(tmpdir.join("dst.txt"))
+    with open(src, "w") as f:
+        f.write("checkpoint")
+    strategy = wandb.util.snapshot_file(src, dst)
+    assert strategy in ("reflink", "copy_file_range", "copy")
+    assert open(dst).read() == "checkpoint"
+    assert os.path.getmtime(dst) == os.path.getmtime(src)
+
+
+def test_checksum_snapshots_copied_files(tmpdir, checksum_step):
+    step, request_queue, output_queue = checksum_step
+    path = str(tmpdir.join("model.h5"))
+    with open(path, "w") as f:
+        f.write("weights")
+    request_queue.put(upload_request(path, "model.h5"))
+    step.finish()
+    (event,) = drain(output_queue)
+    assert event.path != path
+    assert open(event.path).read() == "weights"
+
+
+def test_checksum_skips_unchanged_files(tmpdir, checksum_step):
+    step, request_queue, output_queue = checksum_step
+    path = str(tmpdir.join("model.h5"))
+    other_path = str(tmpdir.join("other.h5"))
+    for p in (path, other_path):
+        with open(p, "w") as f:
+            f.write("weights")
+        os.utime(p, (1000, 1000))
+    request_queue.put(upload_request(path, "model.h5"))
+    request_queue.put(upload_request(path, "model.h5", copy=False))
+    request_queue.put(upload_request(other_path, "other.h5"))
+    uploaded = [output_queue.get(timeout=5).save_name for _ in range(2)]
+    assert sorted(uploaded) == ["model.h5", "other.h5"]
+    with open(path, "w") as f:
+        f.write("new weights")
+    os.utime(path, (0, 0))
+    request_queue.put(upload_request(path, "model.h5"))
+    step.finish()
+    (event,) = drain(output_queue)
+    assert open(event.path).read() == "new weights"
+
+
+def test_checksum_orders_versions_of_a_file(tmpdir, checksum_step, mocker):
+    step, request_queue, output_queue = checksum_step
+    mocker.patch.object(step, "MAX_INFLIGHT_BYTES", 1)
+    paths = []
+    for i in range(20):
+        path = str(tmpdir.join("file%i.txt" % i))
+        with open(path, "w") as f:
+            f.write(str(i))
+        paths.append(path)
+        request_queue.put(upload_request(path, "file%i.txt" % (i % 3)))
+    step.finish()
+    events = drain(output_queue)
+    assert len(events) == 20
+    for name in ("file0.txt", "file1.txt", "file2.txt"):
+        versions = [int(open(e.path).read()) for e in events if e.save_name == name]
+        assert versions == sorted(versions)
+
+
+def test_checksum_uploads_racy_rewrites(tmpdir, checksum_step):
+    step, request_queue, output_queue = checksum_step
+    path = str(tmpdir.join("config.yaml"))
+    with open(path, "w") as f:
+        f.write("a: 1")
+    request_queue.put(upload_request(path, "config.yaml", copy=False))
+    assert open(output_queue.get(timeout=5).path).read() == "a: 1"
+    stat = os.stat(path)
+    # rewritten within the same mtime tick
+    with open(path, "w") as f:
+        f.write("a: 2")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    request_queue.put(upload_request(path, "config.yaml", copy=False))
+    step.finish()
+    (event,) = drain(output_queue)
+    assert open(event.path).read() == "a: 2"
+
+
+def test_checksum_skips_uploaded_content(tmpdir):
+    output_queue = queue.Queue()
+    step = step_checksum.StepChecksum(
+        None,
+        tempfile.TemporaryDirectory("wandb"),
+        queue.Queue(),
+        output_queue,
+        stats.Stats(),
+        upload_digests={"config.yaml": wandb.util.md5_file(__file__)},
+    )
+    step._checksum(upload_request(__file__, "config.yaml"))
+    assert output_queue.empty()
+    step._checksum(upload_request(__file__, "other.yaml"))
+    assert output_queue.get().digest == wandb.util.md5_file(__file__)
+
+
+def test_checksum_hashes_appended_tail(tmpdir, checksum_step):
+    step, _, _ = checksum_step
+    path = str(tmpdir.join("events.out.tfevents.1"))
+    with open(path, "wb") as f:
+        f.write(b"a" * 2000)
+    assert step._file_digest("events.out.tfevents.1", path) == wandb.util.md5_file(path)
+    with open(path, "ab") as f:
+        f.write(b"b" * 3000)
+    assert step._file_digest("events.out.tfevents.1", path) == wandb.util.md5_file(path)
+    assert step._append_hashers["events.out.tfevents.1"][0] == 5000
+
+
+def test_checksum_rehashes_rewritten_log(tmpdir, checksum_step):
+    step, _, _ = checksum_step
+    path = str(tmpdir.join("output.log"))
+    with open(path, "wb") as f:
+        f.write(b"a" * 2000)
+    os.utime(path, (1000, 1000))
+    assert step._file_digest("output.log", path) == wandb.util.md5_file(path)
+    # rewritten in place with the same size
+    with open(path, "wb") as f:
+        f.write(b"b" * 2000)
+    assert step._file_digest("output.log", path) == wandb.util.md5_file(path)
+    # truncated and grown past the previous size
+    with open(path, "wb") as f:
+        f.write(b"c" * 3000)
+    assert step._file_digest("output.log", path) == wandb.util.md5_file(path)
+
+
+def test_upload_priority():
+    assert bandwidth.upload_priority("wandb-metadata.json") == 0
+    assert bandwidth.upload_priority("media/images/a.png") == 1
+    assert bandwidth.upload_priority("model.h5", artifact_id="abc") == 2
+    assert bandwidth.upload_priority("model.h5") == 3
+
+
+def test_token_bucket_limits_rate(mocker):
+    clock = [0.0]
+    mocker.patch.object(bandwidth.time, "time", lambda: clock[0])
+    bucket = bandwidth.TokenBucket(rate=1000)
+
+    class FakeCondition(object):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def wait(self, timeout):
+            clock[0] += timeout
+
+        def notify_all(self):
+            pass
+
+    bucket._cond = FakeCondition()
+    bucket.consume(1000)
+    assert clock[0] == 0
+    bucket.consume(500)
+    assert 0.5 <= clock[0] < 0.6
+    bucket.consume(10000)
+    assert 1.5 <= clock[0] < 1.6
+
+
+def test_token_bucket_unlimited():
+    bucket = bandwidth.TokenBucket()
+    bucket.consume(10 ** 12)
+
+
+class FakeFilePusher(object):
+    def __init__(self):
+        self.changed = []
+
+    def file_changed(self, save_name, path, copy=True):
+        self.changed.append(save_name)
+
+
+WatcherSettings = collections.namedtuple(
+    "WatcherSettings", "files_dir ignore_globs file_quiescence file_watcher"
+)
+
+
+@pytest.fixture
+def watcher_settings(tmpdir):
+    files_dir = tmpdir.mkdir("files")
+    return WatcherSettings(
+        files_dir=str(files_dir),
+        ignore_globs=[],
+        file_quiescence=None,
+        file_watcher=None,
+    )
+
+
+@pytest.mark.parametrize("file_watcher", [None, "inotify"])
+def test_dir_watcher_picks_up_files(watcher_settings, file_watcher):
+    pusher = FakeFilePusher()
+    watcher = dir_watcher.DirWatcher(
+        watcher_settings._replace(file_watcher=file_watcher), None, pusher
+    )
+    assert watcher.polling == (file_watcher is None or dir_watcher.wd_inotify is None)
+    watcher.update_policy("*.txt", "now")
+    with open(os.path.join(watcher_settings.files_dir, "a.txt"), "w") as f:
+        f.write("now")
+    with open(os.path.join(watcher_settings.files_dir, "b.h5"), "w") as f:
+        f.write("end")
+    watcher.finish()
+    assert sorted(pusher.changed) == ["a.txt", "b.h5"]
+
+
+def test_dir_watcher_falls_back_to_polling(watcher_settings, mocker):
+    if dir_watcher.wd_inotify is None:
+        pytest.skip("inotify is only available on linux")
+    mocker.patch.object(
+        dir_watcher.wd_inotify.InotifyObserver,
+        "start",
+        side_effect=OSError(28, "inotify watch limit reached"),
+    )
+    watcher = dir_watcher.DirWatcher(
+        watcher_settings._replace(file_watcher="inotify"), None, FakeFilePusher()
+    )
+    assert watcher.polling
+    watcher.finish()
+
+
+def test_compile_glob():
+    assert dir_watcher.compile_glob("*.txt").match("a.txt")
+    assert not dir_watcher.compile_glob("*.txt").match("sub/a.txt")
+    assert dir_watcher.compile_glob("sub/*.txt").match("sub/a.txt")
+    assert dir_watcher.compile_glob("ckpt-?[!0-9].h5").match("ckpt-1a.h5")
+    assert not dir_watcher.compile_glob("ckpt-?[!0-9].h5").match("ckpt-11.h5")
+
+
+def test_dir_watcher_policy_matchers(watcher_settings):
+    watcher = dir_watcher.DirWatcher(watcher_settings, None, FakeFilePusher())
+    watcher.update_policy("*.log", "live")
+    watcher.update_policy("ckpt/*", "now")
+    watcher.update_policy("ckpt/*.log", "live")
+    policies = {
+        name: watcher._get_file_event_handler(
+            os.path.join(watcher_settings.files_dir, name), name
+        ).policy
+        for name in ("train.log", "ckpt/model.h5", "ckpt/train.log", "model.log.h5")
+    }
+    watcher.finish()
+    assert policies == {
+        "train.log": "live",
+        "ckpt/model.h5": "now",
+        "ckpt/train.log": "now",
+        "model.log.h5": "end",
+    }
+
+
+def test_dir_watcher_final_scan_skips_pushed_files(watcher_settings):
+    pusher = FakeFilePusher()
+    watcher = dir_watcher.DirWatcher(watcher_settings, None, pusher)
+    for name in ("synced.txt", "changed.txt", "end.h5"):
+        with open(os.path.join(watcher_settings.files_dir, name), "w") as f:
+            f.write(name)
+    watcher.update_policy("*.txt", "live")
+    assert sorted(pusher.changed) == ["changed.txt", "synced.txt"]
+    with open(os.path.join(watcher_settings.files_dir, "changed.txt"), "a") as f:
+        f.write("more")
+    os.mkdir(os.path.join(watcher_settings.files_dir, "sub"))
+    with open(os.path.join(watcher_settings.files_dir, "sub", "late.h5"), "w") as f:
+        f.write("late")
+    del pusher.changed[:]
+    watcher.finish()
+    assert sorted(pusher.changed) == ["changed.txt", "end.h5", "sub/late.h5"]
+
+
+def test_dir_watcher_pushes_immediately_by_default(tmpdir, watcher_settings):
+    pusher = FakeFilePusher()
+    watcher = dir_watcher.DirWatcher(watcher_settings, None, pusher)
+    assert watcher._settling_thread is None
+    watcher.update_policy("*.ckpt", "now")
+    path = str(tmpdir.join("model.ckpt"))
+    open(path, "w").write("ckpt")
+    watcher._file_changed(path, "model.ckpt")
+    assert pusher.changed == ["model.ckpt"]
+    watcher.finish()
+
+
+def test_dir_watcher_waits_for_files_to_settle(tmpdir, watcher_settings, mocker):
+    clock = [0.0]
+    mocker.patch.object(
+        dir_watcher, "time", mocker.Mock(time=lambda: clock[0], sleep=time.sleep)
+    )
+    pusher = FakeFilePusher()
+    watcher = dir_watcher.DirWatcher(
+        watcher_settings._replace(file_quiescence=10), None, pusher
+    )
+    watcher.update_policy("*.ckpt", "now")
+    # outside of the watched directory so only we report changes
+    path = str(tmpdir.join("model.ckpt"))
+    with open(path, "w") as f:
+        f.write("part")
+        f.flush()
+        watcher._file_changed(path, "model.ckpt")
+        watcher._push_settled()
+        clock[0] = 5
+        f.write("more")
+    watcher._push_settled()
+    clock[0] = 12
+    watcher._push_settled()
+    assert pusher.changed == []
+    clock[0] = 15
+    watcher._push_settled()
+    assert pusher.changed == ["model.ckpt"]
+    mocker.stopall()
+    watcher.finish()
+    assert pusher.changed == ["model.ckpt"]
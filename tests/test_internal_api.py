@@ -0,0 +1,93 @@
+"""internal api tests."""
+
+import os
+
+import pytest
+import wandb
+from wandb.old import retry
+
+internal_api = wandb.wandb_sdk.internal.internal_api
+
+RESUMABLE_URL = "http://localhost/storage/resumable"
+RESUMABLE_HEADERS = {"x-goog-resumable": "start"}
+
+
+@pytest.fixture
+def chunked_api(mocker, monkeypatch, tmpdir):
+    monkeypatch.setenv("WANDB_CACHE_DIR", str(tmpdir.join("cache")))
+    mocker.patch.object(internal_api.Api, "UPLOAD_CHUNK_SIZE", 1024)
+    mocker.patch.object(internal_api.time, "sleep")
+    return internal_api.Api()
+
+
+@pytest.fixture
+def big_file(tmpdir):
+    path = str(tmpdir.join("big.bin"))
+    with open(path, "wb") as f:
+        f.write(os.urandom(1024 * 3 + 512))
+    return path
+
+
+def test_upload_file_resumable(mock_server, chunked_api, big_file):
+    with open(big_file, "rb") as f:
+        chunked_api.upload_file(RESUMABLE_URL, f, extra_headers=RESUMABLE_HEADERS)
+    session = mock_server.ctx["resumable_sessions"]["0"]
+    assert session == {"received": 1024 * 3 + 512, "chunks": 4}
+
+
+def test_upload_file_resumable_retries_chunk(mock_server, chunked_api, big_file):
+    mock_server.set_context("fail_resumable_times", 2)
+    mock_server.set_context("fail_resumable_chunk", 2)
+    progress = []
+    with open(big_file, "rb") as f:
+        chunked_api.upload_file(
+            RESUMABLE_URL,
+            f,
+            callback=lambda _, t: progress.append(t),
+            extra_headers=RESUMABLE_HEADERS,
+        )
+    # The failed chunk is retried but the chunks before it aren't resent
+    assert len(mock_server.ctx["resumable_sessions"]) == 1
+    assert mock_server.ctx["resumable_sessions"]["0"]["chunks"] == 4
+    assert progress[-1] == 1024 * 3 + 512
+
+
+def test_upload_file_resumable_resumes_session(
+    mock_server, chunked_api, big_file, mocker
+):
+    mock_server.set_context("fail_resumable_times", 1)
+    mock_server.set_context("fail_resumable_chunk", 2)
+    mocker.patch.object(internal_api.Api, "UPLOAD_CHUNK_RETRIES", 0)
+    with open(big_file, "rb") as f:
+        with pytest.raises(retry.TransientException):
+            chunked_api.upload_file(RESUMABLE_URL, f, extra_headers=RESUMABLE_HEADERS)
+    assert mock_server.ctx["resumable_sessions"]["0"]["received"] == 2048
+
+    # A new process picks the session back up from the cache dir
+    with open(big_file, "rb") as f:
+        internal_api.Api().upload_file(
+            RESUMABLE_URL, f, extra_headers=RESUMABLE_HEADERS
+        )
+    assert len(mock_server.ctx["resumable_sessions"]) == 1
+    assert mock_server.ctx["resumable_sessions"]["0"] == {
+        "received": 1024 * 3 + 512,
+        "chunks": 4,
+    }
+
+
+def test_upload_file_resumable_status_unavailable(
+    mock_server, chunked_api, big_file, mocker
+):
+    mock_server.set_context("fail_resumable_times", 1)
+    mock_server.set_context("fail_resumable_chunk", 2)
+    mock_server.set_context("fail_resumable_status_times", 1)
+    with open(big_file, "rb") as f:
+        with pytest.raises(retry.TransientException):
+            chunked_api.upload_file(RESUMABLE_URL, f, extra_headers=RESUMABLE_HEADERS)
+
+    # The session is kept, the next attempt asks for the offset again
+    with open(big_file, "rb") as f:
+        chunked_api.upload_file(RESUMABLE_URL, f, extra_headers=RESUMABLE_HEADERS)
+    assert mock_server.ctx["resumable_sessions"] == {
+        "0": {"received": 1024 * 3 + 512, "chunks": 4}
+    }
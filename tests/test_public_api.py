@@ -5,10 +5,12 @@ test_wandb
 Tests for the `wandb.apis.PublicApi` module.
 """
 
+from functools import partial
 import os
 import json
 import pytest
 import platform
+import time
 
 import wandb
 from wandb import Api
@@ -310,7 +312,7 @@ def test_artifact_file(runner, mock_server, api):
         assert path == os.path.join(".", "artifacts", part, "digits.h5")
 
 
-def test_artifact_download(runner, mock_server, api):
+def test_artifact_download(runner, mock_server, api, capsys):
     with runner.isolated_filesystem():
         art = api.artifact("entity/project/mnist:v0", type="dataset")
         path = art.download()
@@ -319,6 +321,110 @@ def test_artifact_download(runner, mock_server, api):
         else:
             part = "mnist:v0"
         assert path == os.path.join(".", "artifacts", part)
+        # only large downloads are reported
+        _, err = capsys.readouterr()
+        assert "Downloading" not in err
+
+
+def test_artifact_download_filtered(runner, mock_server, api):
+    with runner.isolated_filesystem():
+        art = api.artifact("entity/project/mnist:v0", type="dataset")
+        art.download(root="excluded", exclude=["*.h5"])
+        art.download(root="prefix", path_prefix="other/")
+        assert not os.path.exists("excluded/digits.h5")
+        assert not os.path.exists("prefix/digits.h5")
+        art.download(root="included", path_prefix="dig", include=["*.h5"])
+        assert os.path.exists("included/digits.h5")
+
+
+def test_artifact_open(runner, mock_server, api):
+    with runner.isolated_filesystem():
+        art = api.artifact("entity/project/mnist:v0", type="dataset")
+        with art.open("digits.h5", "rb") as f:
+            contents = f.read()
+        with open(art.get_path("digits.h5").cache_path(), "rb") as f:
+            assert f.read() == contents
+        # only the cache is populated
+        assert not os.path.exists(art._default_root())
+        with pytest.raises(ValueError):
+            art.open("digits.h5", "w")
+
+
+@pytest.mark.skipif(
+    platform.system() == "Windows", reason="Links need privileges on Windows"
+)
+def test_artifact_download_link_modes(runner, mock_server, api):
+    with runner.isolated_filesystem():
+        art = api.artifact("entity/project/mnist:v0", type="dataset")
+        cache_path = art.get_path("digits.h5").cache_path()
+        os.chmod(cache_path, 0o644)
+        # the default never shares the cache object, downloads stay writable
+        default = art.get_path("digits.h5").download("default")
+        assert not os.path.samefile(default, cache_path)
+        assert os.stat(default).st_mode & 0o222
+        assert os.stat(cache_path).st_mode & 0o222
+
+        copied = art.get_path("digits.h5").download("copy", link_mode="copy")
+        assert os.stat(copied).st_mode & 0o222
+        assert os.stat(cache_path).st_mode & 0o222
+
+        linked = art.get_path("digits.h5").download("hardlink", link_mode="hardlink")
+        assert os.path.samefile(linked, cache_path)
+        assert not os.stat(linked).st_mode & 0o222
+
+        # copies of a read-only cache object stay writable
+        os.remove(copied)
+        copied = art.get_path("digits.h5").download("copy", link_mode="copy")
+        assert os.stat(copied).st_mode & 0o222
+        assert os.path.getmtime(copied) == os.path.getmtime(cache_path)
+
+        symlinked = art.get_path("digits.h5").download("sym", link_mode="symlink")
+        assert os.path.realpath(symlinked) == os.path.realpath(cache_path)
+        with pytest.raises(ValueError):
+            art.get_path("digits.h5").download("bad", link_mode="move")
+
+
+def test_run_downloads_small_files_first(monkeypatch):
+    import multiprocessing.dummy
+
+    pool = multiprocessing.dummy.Pool(1)
+    monkeypatch.setattr(wandb.apis.public, "_download_pool", pool)
+    started = []
+    jobs = [(size, partial(started.append, size)) for size in (30, 10, 20, 0)]
+    wandb.apis.public._run_downloads(jobs)
+    pool.close()
+    assert started == [0, 10, 20, 30]
+
+
+def test_run_downloads_waits_for_all_jobs(monkeypatch):
+    import multiprocessing.dummy
+
+    pool = multiprocessing.dummy.Pool(2)
+    monkeypatch.setattr(wandb.apis.public, "_download_pool", pool)
+    done = []
+
+    def fail():
+        raise ValueError("bad file")
+
+    def slow():
+        time.sleep(0.2)
+        done.append(True)
+
+    with pytest.raises(ValueError, match="bad file"):
+        wandb.apis.public._run_downloads([(0, fail), (1, slow)])
+    assert done == [True]
+    pool.close()
+
+
+def test_close_download_pool(monkeypatch):
+    monkeypatch.setattr(wandb.apis.public, "_download_pool", None)
+    wandb.apis.public._run_downloads([(0, lambda: None)])
+    pool = wandb.apis.public._download_pool
+    assert pool is not None
+    wandb.apis.public._close_download_pool()
+    assert wandb.apis.public._download_pool is None
+    with pytest.raises(ValueError):
+        pool.apply(lambda: None)
 
 
 def test_artifact_run_used(runner, mock_server, api):
@@ -367,11 +473,36 @@ def test_artifact_manual_error(runner, mock_server, api):
 )
 def test_artifact_verify(runner, mock_server, api):
     art = api.artifact("entity/project/mnist:v0", type="dataset")
-    art.download()
+    path = art.download()
+    art.verify()
+    with open(os.path.join(path, "digits.h5"), "ab") as f:
+        f.write(b"X")
     with pytest.raises(ValueError):
         art.verify()
 
 
+def test_artifact_verify_report(runner, mock_server, api):
+    with runner.isolated_filesystem():
+        art = api.artifact("entity/project/mnist:v0", type="dataset")
+        with pytest.raises(ValueError, match="1 of 1 files:\n  digits.h5: missing"):
+            art.verify()
+        path = art.get_path("digits.h5").download()
+        art.verify(fast=True)
+        # downloads are checked, so only a later write can corrupt the file
+        with open(path, "ab") as f:
+            f.write(b"X")
+        with pytest.raises(ValueError, match="digits.h5: size mismatch"):
+            art.verify(fast=True)
+
+        entry = art._load_manifest().entries["digits.h5"]
+        entry.size = os.path.getsize(path)
+        with pytest.raises(ValueError, match="digits.h5: digest mismatch"):
+            art.verify(num_workers=2, fail_fast=True)
+        entry.digest = wandb.wandb_sdk.interface.artifacts.md5_file_b64(path)
+        art.verify()
+        art.verify(fast=True)
+
+
 def test_sweep(runner, mock_server, api):
     sweep = api.sweep("test/test/test")
     assert sweep.entity == "test"
@@ -1,6 +1,8 @@
 """Mock Server for simple calls the cli and public api make"""
 
 from flask import Flask, request, g
+import base64
+import hashlib
 import os
 import sys
 from datetime import datetime, timedelta
@@ -18,6 +20,65 @@ import threading
 from tests.utils.mock_requests import RequestsMock
 
 
+def md5_b64(body):
+    return base64.b64encode(hashlib.md5(body.encode()).digest()).decode("ascii")
+
+
+# Contents of the files in the mock artifact manifests, served by their md5
+ARTIFACT_FILES = {
+    "digits.h5": "ARTIFACT digits.h5",
+    "dataset.partitioned-table.json": json.dumps(
+        {"_type": "partitioned-table", "parts_path": "parts"}
+    ),
+    "parts/1.table.json": json.dumps(
+        {
+            "_type": "table",
+            "column_types": {
+                "params": {
+                    "type_map": {
+                        "A": {
+                            "params": {
+                                "allowed_types": [
+                                    {"wb_type": "none"},
+                                    {"wb_type": "number"},
+                                ]
+                            },
+                            "wb_type": "union",
+                        },
+                        "B": {
+                            "params": {
+                                "allowed_types": [
+                                    {"wb_type": "none"},
+                                    {"wb_type": "number"},
+                                ]
+                            },
+                            "wb_type": "union",
+                        },
+                        "C": {
+                            "params": {
+                                "allowed_types": [
+                                    {"wb_type": "none"},
+                                    {"wb_type": "number"},
+                                ]
+                            },
+                            "wb_type": "union",
+                        },
+                    }
+                },
+                "wb_type": "dictionary",
+            },
+            "columns": ["A", "B", "C"],
+            "data": [[0, 0, 1]],
+            "ncols": 3,
+            "nrows": 1,
+        }
+    ),
+}
+ARTIFACT_FILES_BY_MD5 = {
+    hashlib.md5(body.encode()).hexdigest(): body for body in ARTIFACT_FILES.values()
+}
+
+
 def default_ctx():
     return {
         "fail_graphql_count": 0,  # used via "fail_graphql_times"
@@ -639,12 +700,16 @@ def create_app(user_ctx=None):
                     "storagePolicyConfig": {},
                     "contents": {
                         "dataset.partitioned-table.json": {
-                            "digest": "0aaaaaaaaaaaaaaaaaaaaa==",
-                            "size": 81299,
+                            "digest": md5_b64(
+                                ARTIFACT_FILES["dataset.partitioned-table.json"]
+                            ),
+                            "size": len(
+                                ARTIFACT_FILES["dataset.partitioned-table.json"]
+                            ),
                         },
                         "parts/1.table.json": {
-                            "digest": "1aaaaaaaaaaaaaaaaaaaaa==",
-                            "size": 81299,
+                            "digest": md5_b64(ARTIFACT_FILES["parts/1.table.json"]),
+                            "size": len(ARTIFACT_FILES["parts/1.table.json"]),
                         },
                     },
                 }
@@ -655,8 +720,8 @@ def create_app(user_ctx=None):
                     "storagePolicyConfig": {},
                     "contents": {
                         "digits.h5": {
-                            "digest": "TeSJ4xxXg0ohuL5xEdq2Ew==",
-                            "size": 81299,
+                            "digest": md5_b64(ARTIFACT_FILES["digits.h5"]),
+                            "size": len(ARTIFACT_FILES["digits.h5"]),
                         },
                     },
                 }
@@ -683,64 +748,58 @@ index 30d74d2..9a2c773 100644
 """
         return "", 200
 
-    @app.route("/artifacts/<entity>/<digest>", methods=["GET", "POST"])
-    def artifact_file(entity, digest):
-        if entity == "entity":
-            if (
-                digest == "d1a69a69a69a69a69a69a69a69a69a69"
-            ):  # "dataset.partitioned-table.json"
-                return (
-                    json.dumps({"_type": "partitioned-table", "parts_path": "parts"}),
-                    200,
-                )
-            elif digest == "d5a69a69a69a69a69a69a69a69a69a69":  # "parts/1.table.json"
-                return (
-                    json.dumps(
-                        {
-                            "_type": "table",
-                            "column_types": {
-                                "params": {
-                                    "type_map": {
-                                        "A": {
-                                            "params": {
-                                                "allowed_types": [
-                                                    {"wb_type": "none"},
-                                                    {"wb_type": "number"},
-                                                ]
-                                            },
-                                            "wb_type": "union",
-                                        },
-                                        "B": {
-                                            "params": {
-                                                "allowed_types": [
-                                                    {"wb_type": "none"},
-                                                    {"wb_type": "number"},
-                                                ]
-                                            },
-                                            "wb_type": "union",
-                                        },
-                                        "C": {
-                                            "params": {
-                                                "allowed_types": [
-                                                    {"wb_type": "none"},
-                                                    {"wb_type": "number"},
-                                                ]
-                                            },
-                                            "wb_type": "union",
-                                        },
-                                    }
-                                },
-                                "wb_type": "dictionary",
-                            },
-                            "columns": ["A", "B", "C"],
-                            "data": [[0, 0, 1]],
-                            "ncols": 3,
-                            "nrows": 1,
-                        }
-                    ),
-                    200,
+    @app.route("/storage/resumable", methods=["POST"])
+    def resumable_start():
+        ctx = get_ctx()
+        if request.headers.get("x-goog-resumable") != "start":
+            return "Missing x-goog-resumable header", 400
+        ctx["resumable_sessions"] = ctx.get("resumable_sessions", {})
+        session_id = str(len(ctx["resumable_sessions"]))
+        ctx["resumable_sessions"][session_id] = {"received": 0, "chunks": 0}
+        location = request.url_root + "storage/resumable/" + session_id
+        return "", 201, {"Location": location}
+
+    @app.route("/storage/resumable/<session_id>", methods=["PUT"])
+    def resumable_chunk(session_id):
+        ctx = get_ctx()
+        session = ctx.get("resumable_sessions", {}).get(session_id)
+        if session is None:
+            return "No such session", 404
+        content_range = request.headers.get("Content-Range", "")
+        data = request.get_data()
+        if content_range.startswith("bytes */"):
+            # status request
+            if ctx.get("fail_resumable_status_count", 0) < ctx.get(
+                "fail_resumable_status_times", 0
+            ):
+                ctx["fail_resumable_status_count"] = (
+                    ctx.get("fail_resumable_status_count", 0) + 1
                 )
+                return "Server down", 503
+            if session["received"] == int(content_range.split("/")[-1]):
+                return "", 200
+        else:
+            if ctx.get("fail_resumable_count", 0) < ctx.get("fail_resumable_times", 0):
+                if session["chunks"] == ctx.get("fail_resumable_chunk", 0):
+                    ctx["fail_resumable_count"] = ctx.get("fail_resumable_count", 0) + 1
+                    return "Server down", 503
+            start_end, total = content_range[len("bytes ") :].split("/")
+            start = int(start_end.split("-")[0])
+            if start != session["received"]:
+                return "Non contiguous chunk", 400
+            session["received"] += len(data)
+            session["chunks"] += 1
+            if session["received"] == int(total):
+                return "", 200
+        if session["received"] == 0:
+            return "", 308
+        return "", 308, {"Range": "bytes=0-%i" % (session["received"] - 1)}
 
+    @app.route("/artifacts/<entity>/<digest>", methods=["GET", "POST"])
+    def artifact_file(entity, digest):
+        body = ARTIFACT_FILES_BY_MD5.get(digest)
+        if body is not None:
+            return body, 200
         return "ARTIFACT %s" % digest, 200
 
     @app.route("/files/<entity>/<project>/<run>/file_stream", methods=["POST"])
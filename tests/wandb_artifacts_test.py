@@ -1,6 +1,12 @@
+import base64
+import hashlib
+import itertools
+import json
 import os
 import sys
+import threading
 import pytest
+import requests
 from wandb import util
 import wandb
 import shutil
@@ -26,24 +32,29 @@ def mock_boto(artifact, path=False):
                     {"Error": {"Code": "404"}}, "HeadObject"
                 )
 
-    class Filtered(object):
-        def limit(self, *args, **kwargs):
-            return [S3Object(), S3Object(name="my_other_object.pb")]
+    class Paginator(object):
+        def paginate(self, **kwargs):
+            mock.paginate_kwargs = kwargs
+            yield {"Contents": [{"Key": "my_object.pb"}]}
+            yield {"Contents": [{"Key": "my_other_object.pb"}]}
 
-    class S3Objects(object):
-        def filter(self, **kwargs):
-            return Filtered()
+    class S3Client(object):
+        def get_paginator(self, operation):
+            return Paginator()
 
-    class S3Bucket(object):
-        def __init__(self, *args, **kwargs):
-            self.objects = S3Objects()
+    class Meta(object):
+        client = S3Client()
 
     class S3Resource(object):
+        meta = Meta()
+
         def Object(self, bucket, key):
             return S3Object()
 
-        def Bucket(self, bucket):
-            return S3Bucket()
+        def ObjectSummary(self, bucket, key):
+            obj = S3Object(name=key)
+            obj.meta = Meta()
+            return obj
 
     mock = S3Resource()
     handler = artifact._storage_policy._handler._handlers["s3"]
@@ -67,7 +78,14 @@ def mock_gcs(artifact, path=False):
             return None if path else Blob()
 
         def list_blobs(self, *args, **kwargs):
-            return [Blob(), Blob(name="my_other_object.pb")]
+            mock.list_blobs_kwargs = kwargs
+            return Blobs()
+
+    class Page(list):
+        prefixes = set()
+
+    class Blobs(object):
+        pages = [Page([Blob()]), Page([Blob(name="my_other_object.pb")])]
 
     class GSClient(object):
         def bucket(self, bucket):
@@ -179,6 +197,35 @@ def test_add_named_dir(runner):
         }
 
 
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_add_dir_nested(runner, use_processes):
+    with runner.isolated_filesystem():
+        for i in range(30):
+            util.mkdir_exists_ok(os.path.join("data", str(i % 3)))
+            open(os.path.join("data", str(i % 3), "%i.txt" % i), "w").write(str(i))
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        artifact.add_dir("data", num_workers=2, use_processes=use_processes)
+
+        manifest = artifact.manifest.to_manifest_json()
+        assert len(manifest["contents"]) == 30
+        assert manifest["contents"]["1/4.txt"] == {
+            "digest": wandb.wandb_sdk.interface.artifacts.md5_file_b64("data/1/4.txt"),
+            "size": 1,
+        }
+
+
+def test_add_dir_hash_error(runner, mocker):
+    with runner.isolated_filesystem():
+        for i in range(100):
+            open("%i.txt" % i, "w").write(str(i))
+        mocker.patch(
+            "wandb.sdk.wandb_artifacts.md5_file_b64", side_effect=IOError("disk error")
+        )
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        with pytest.raises(IOError):
+            artifact.add_dir(".", num_workers=2)
+
+
 def test_add_reference_local_file(runner):
     with runner.isolated_filesystem():
         open("file1.txt", "w").write("hello")
@@ -328,9 +375,10 @@ def test_add_s3_reference_path(runner, mocker, capsys):
 def test_add_s3_max_objects(runner, mocker, capsys):
     with runner.isolated_filesystem():
         artifact = wandb.Artifact(type="dataset", name="my-arty")
-        mock_boto(artifact, path=True)
+        mock = mock_boto(artifact, path=True)
         with pytest.raises(ValueError):
             artifact.add_reference("s3://my-bucket/", max_objects=1)
+        assert mock.paginate_kwargs["PaginationConfig"] == {"MaxItems": 1}
 
 
 def test_add_reference_s3_no_checksum(runner):
@@ -383,8 +431,9 @@ def test_add_gs_reference_object_with_name(runner, mocker):
 def test_add_gs_reference_path(runner, mocker, capsys):
     with runner.isolated_filesystem():
         artifact = wandb.Artifact(type="dataset", name="my-arty")
-        mock_gcs(artifact, path=True)
+        mock = mock_gcs(artifact, path=True)
         artifact.add_reference("gs://my-bucket/")
+        assert mock.list_blobs_kwargs["max_results"] == 10000
 
         assert artifact.digest == "17955d00a20e1074c3bc96c74b724bfe"
         manifest = artifact.manifest.to_manifest_json()
@@ -815,3 +864,530 @@ def test_add_partition_folder(runner):
             "digest": "uo/SjoAO+O7pcSfg+yhlDg==",
             "size": 61,
         }
+
+
+def test_hash_cache(tmpdir, mocker, hash_cache):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    cache = hash_cache
+    cache.RACY_SECONDS = 0
+    hash_file = mocker.spy(artifacts, "md5_hash_file")
+    path = str(tmpdir.join("data.txt"))
+    open(path, "w").write("hello")
+
+    assert artifacts.md5_file_b64(path) == "XUFAKrxLKna5cZ2REBfFkg=="
+    assert artifacts.md5_file_b64(path) == "XUFAKrxLKna5cZ2REBfFkg=="
+    assert hash_file.call_count == 1
+
+    # Any change to the file invalidates the entry, even if the mtime is kept
+    mtime = os.path.getmtime(path)
+    open(path, "w").write("world")
+    os.utime(path, (mtime, mtime))
+    assert artifacts.md5_file_b64(path) == "fXkwN6B2AYZXSwKC8vQ15w=="
+    assert hash_file.call_count == 2
+
+    # Recently modified files aren't remembered
+    cache.RACY_SECONDS = 60
+    open(path, "w").write("hello")
+    artifacts.md5_file_b64(path)
+    artifacts.md5_file_b64(path)
+    assert hash_file.call_count == 4
+    artifacts.md5_file_b64(path, use_cache=False)
+    assert hash_file.call_count == 5
+
+
+def test_hash_cache_corrupt_db(tmpdir):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    db_path = str(tmpdir.join("hashes.db"))
+    open(db_path, "w").write("not a database" * 100)
+    cache = artifacts.HashCache(db_path)
+    assert cache.get(__file__, os.stat(__file__)) is None
+    cache.close()
+
+
+def test_hash_cache_threads_share_connection(tmpdir, mocker, hash_cache):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    hash_cache.RACY_SECONDS = 0
+    connect = mocker.spy(artifacts.sqlite3, "connect")
+    paths = []
+    for i in range(8):
+        paths.append(str(tmpdir.join("%i.txt" % i)))
+        open(paths[-1], "w").write(str(i))
+    for _ in range(5):
+        threads = [
+            threading.Thread(target=artifacts.md5_file_b64, args=(p,)) for p in paths
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert connect.call_count == 1
+
+
+def test_hash_cache_unwritable_dir(tmpdir, mocker):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    open(str(tmpdir.join("cache")), "w").close()
+    cache = artifacts.HashCache(str(tmpdir.join("cache", "artifacts", "hashes.db")))
+    mocker.patch.object(artifacts, "get_hash_cache", return_value=cache)
+    assert artifacts.md5_file_b64(__file__) == artifacts.md5_file_b64(
+        __file__, use_cache=False
+    )
+    assert cache._disabled
+
+
+def test_artifact_seed(runner, mocker):
+    with runner.isolated_filesystem():
+        open("a.txt", "w").write("hello")
+        open("b.txt", "w").write("world")
+        base_artifact = wandb.Artifact(type="dataset", name="my-arty")
+        base_artifact.add_file("a.txt")
+        base_artifact.add_file("b.txt")
+        manifest = wandb.wandb_sdk.wandb_artifacts.ArtifactManifestV1.from_manifest_json(
+            None, base_artifact.manifest.to_manifest_json()
+        )
+        for entry in manifest.entries.values():
+            entry.birth_artifact_id = "base-id"
+        base = mocker.Mock(manifest=manifest, id="base-id")
+
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        artifact.seed(base)
+        open("b.txt", "w").write("changed")
+        open("c.txt", "w").write("hello")
+        artifact.add_file("b.txt")
+        artifact.add_file("c.txt")
+        artifact.remove("a.txt")
+
+        assert artifact.diff() == (["c.txt"], ["a.txt"], ["b.txt"])
+        entries = artifact.manifest.entries
+        # c.txt has the same content as a.txt, which is already stored
+        assert entries["c.txt"].local_path is None
+        assert entries["c.txt"].birth_artifact_id == "base-id"
+        assert entries["b.txt"].local_path is not None
+        assert entries["b.txt"].birth_artifact_id is None
+
+
+def test_manifest_streaming_json_round_trip(runner):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    with runner.isolated_filesystem():
+        open("file1.txt", "w").write("hello")
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        artifact.add_file("file1.txt", name="a/file1.txt")
+        artifact.add_reference("file://file1.txt", name="b/ref.txt")
+        manifest = artifact.manifest
+        manifest.entries["a/file1.txt"].birth_artifact_id = "abc"
+
+        with open("manifest.json", "w") as fp:
+            manifest.write_manifest_json(fp)
+        text = open("manifest.json").read()
+        assert json.loads(text) == manifest.to_manifest_json()
+
+        loaded = artifacts.ArtifactManifest.from_manifest_text(None, text)
+        assert loaded.to_manifest_json() == manifest.to_manifest_json()
+        # contents don't have to come last
+        reordered = json.dumps(
+            dict(reversed(list(manifest.to_manifest_json().items()))), indent=2
+        )
+        loaded = artifacts.ArtifactManifest.from_manifest_text(None, reordered)
+        assert loaded.to_manifest_json() == manifest.to_manifest_json()
+        assert not hasattr(loaded.entries["a/file1.txt"], "__dict__")
+
+
+def test_manifest_entries_in_directory():
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    manifest = wandb.wandb_sdk.wandb_artifacts.ArtifactManifestV1(None, None)
+    for path in ("a/x.txt", "a/b/y.txt", "a.txt", "ab/z.txt", "a/c.txt"):
+        manifest.add_entry(artifacts.ArtifactManifestEntry(path, None, "digest"))
+
+    def paths(entries):
+        return [entry.path for entry in entries]
+
+    assert paths(manifest.get_entries_in_directory("a")) == [
+        "a/b/y.txt",
+        "a/c.txt",
+        "a/x.txt",
+    ]
+    assert paths(manifest.get_entries_in_directory("a/b")) == ["a/b/y.txt"]
+    assert paths(manifest.get_entries_with_prefix("a")) == [
+        "a.txt",
+        "a/b/y.txt",
+        "a/c.txt",
+        "a/x.txt",
+        "ab/z.txt",
+    ]
+    manifest.remove_entry("a/c.txt")
+    manifest.add_entry(artifacts.ArtifactManifestEntry("a/d.txt", None, "digest"))
+    assert paths(manifest.get_entries_in_directory("a")) == [
+        "a/b/y.txt",
+        "a/d.txt",
+        "a/x.txt",
+    ]
+    assert manifest.get_entries_in_directory("missing") == []
+
+
+def test_artifacts_cache_evicts_least_recently_used(tmpdir):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    cache = artifacts.ArtifactsCache(str(tmpdir.join("cache")), max_size=3500)
+    cache.EVICTION_GRACE_SECONDS = 0
+    paths = []
+    for i, etag in enumerate(["aaaa", "bbbb", "cccc"]):
+        path, hit = cache.check_etag_obj_path(etag, 1000)
+        assert not hit
+        open(path, "w").write("x" * 1000)
+        os.utime(path, (i, i))
+        paths.append(path)
+    # a hit makes "aaaa" the most recently used object
+    assert cache.check_etag_obj_path("aaaa", 1000) == (paths[0], True)
+    assert os.path.getmtime(paths[0]) == 0
+
+    # writing a fourth object goes over the budget
+    cache.check_etag_obj_path("dddd", 1000)
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert not os.path.exists(paths[2])
+
+    assert cache.cleanup(0) == 1000
+    assert not os.path.exists(paths[0])
+
+
+def test_artifacts_cache_keeps_pinned_objects(runner, mocker):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    with runner.isolated_filesystem():
+        cache = artifacts.ArtifactsCache(os.path.abspath("cache"), max_size=1000)
+        cache.EVICTION_GRACE_SECONDS = 0
+        mocker.patch(
+            "wandb.sdk.wandb_artifacts.get_artifacts_cache", return_value=cache
+        )
+        # the artifact is larger than the cache, its files are staged for upload
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        for i in range(3):
+            open("%i.txt" % i, "w").write(str(i) * 600)
+            artifact.add_file("%i.txt" % i)
+        entries = list(artifact._manifest.entries.values())
+        for entry in entries:
+            os.utime(entry.local_path, (0, 0))
+        assert cache.cleanup(0) == 0
+        assert all(os.path.exists(e.local_path) for e in entries)
+
+        # uploaded and removed entries can be evicted
+        cache.unpin(entries[0].local_path, entries[0].path)
+        artifact.remove(entries[1].path)
+        assert cache.cleanup(0) == 1200
+        assert os.path.exists(entries[2].local_path)
+
+        # symlinks pin their object as long as they exist
+        cache.unpin(entries[2].local_path, entries[2].path)
+        os.symlink(entries[2].local_path, "link.txt")
+        cache.pin(entries[2].local_path, "link", link=os.path.abspath("link.txt"))
+        os.utime(entries[2].local_path, (0, 0))
+        assert cache.cleanup(0) == 0
+        os.remove("link.txt")
+        assert cache.cleanup(0) == 600
+        # emptied pin dirs are removed
+        assert os.listdir(os.path.join("cache", "pins")) == []
+
+        # nothing is evicted on its own without a max size, so nothing is pinned
+        cache = artifacts.ArtifactsCache(os.path.abspath("cache2"))
+        mocker.patch(
+            "wandb.sdk.wandb_artifacts.get_artifacts_cache", return_value=cache
+        )
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        artifact.add_file("0.txt")
+        assert not os.path.exists(os.path.join("cache2", "pins"))
+
+
+def test_parse_size():
+    assert wandb.util.parse_size("512") == 512
+    assert wandb.util.parse_size("10KB") == 10 * 1024
+    assert wandb.util.parse_size("1.5 GiB") == 1024 ** 3 * 3 // 2
+    with pytest.raises(ValueError):
+        wandb.util.parse_size("lots")
+
+
+def test_artifacts_cache_write_obj(tmpdir):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    cache = artifacts.ArtifactsCache(str(tmpdir.join("cache")))
+    path, _ = cache.check_etag_obj_path("abcd", 5)
+
+    # a failed download doesn't leave a partial object behind
+    with pytest.raises(IOError):
+        with cache.write_obj(path, 5) as tmp_path:
+            open(tmp_path, "w").write("he")
+            raise IOError("connection reset")
+    assert cache.check_etag_obj_path("abcd", 5) == (path, False)
+
+    # concurrent writers of the same object wait for the first one
+    writes = []
+
+    def write():
+        with cache.write_obj(path, 5) as tmp_path:
+            if tmp_path is not None:
+                writes.append(tmp_path)
+                time.sleep(0.1)
+                open(tmp_path, "w").write("hello")
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(writes) == 1
+    assert open(path).read() == "hello"
+    assert os.listdir(str(tmpdir.join("cache", "tmp"))) == []
+    assert len(os.listdir(str(tmpdir.join("cache", "locks")))) == 1
+
+    # objects share a bounded set of lock files
+    cache.LOCK_KEY_CHARS = 1
+    for i in range(50):
+        path, _ = cache.check_etag_obj_path("abcd%i" % i, 1)
+        with cache.write_obj(path, 1) as tmp_path:
+            open(tmp_path, "w").write("x")
+    locks = os.listdir(str(tmpdir.join("cache", "locks")))
+    assert len([lock for lock in locks if len(lock) == 1]) <= 16
+
+
+def test_http_load_path_closes_unused_response(tmpdir, mocker):
+    artifacts = wandb.wandb_sdk.interface.artifacts
+    cache = artifacts.ArtifactsCache(str(tmpdir.join("cache")))
+    path, _ = cache.check_etag_obj_path("abcd", 5)
+    open(path, "w").write("hello")
+    # written by another process after we checked the cache
+    mocker.patch.object(cache, "check_etag_obj_path", return_value=(path, False))
+    mocker.patch("wandb.sdk.wandb_artifacts.get_artifacts_cache", return_value=cache)
+    session = mocker.Mock()
+    session.get.return_value.headers = {"ETag": '"abcd"', "Content-Length": "5"}
+    handler = wandb.wandb_sdk.wandb_artifacts.HTTPHandler(session)
+    entry = artifacts.ArtifactManifestEntry(
+        "hello.txt", "http://example.com/hello.txt", "abcd", size=5
+    )
+    assert handler.load_path(None, entry, local=True) == path
+    assert session.get.return_value.close.called
+
+
+class FakeRangeSession(object):
+    """Serves `data` with Range support, breaking the connection on request."""
+
+    def __init__(self, data, ranges=True, etag="v1"):
+        self.data = data
+        self.ranges = ranges
+        self.etag = etag
+        self.requests = []
+        self.break_after = {}
+
+    def get(self, url, auth=None, stream=False, headers=None):
+        range_header = (headers or {}).get("Range")
+        self.requests.append(range_header)
+        start, end = 0, len(self.data)
+        if self.ranges and range_header:
+            start, end = [int(n) for n in range_header[6:].split("-")]
+            end += 1
+        body = self.data[start:end]
+        broken = self.break_after.pop(start, None)
+        chunks = [body[i : i + 3] for i in range(0, len(body), 3)]
+
+        class Response(object):
+            status_code = 206 if self.ranges and range_header else 200
+            headers = {"ETag": self.etag}
+            if status_code == 206:
+                headers["Content-Range"] = "bytes %i-%i/%i" % (
+                    start,
+                    end - 1,
+                    len(self.data),
+                )
+
+            def raise_for_status(self):
+                pass
+
+            def iter_content(self, chunk_size=1):
+                for i, chunk in enumerate(chunks):
+                    if broken is not None and i == broken:
+                        raise requests.exceptions.ChunkedEncodingError("reset")
+                    yield chunk
+
+            def close(self):
+                pass
+
+        return Response()
+
+
+def test_download_url_ranges(tmpdir, mocker):
+    wandb_artifacts = wandb.wandb_sdk.wandb_artifacts
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_THRESHOLD", 10)
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_PART_SIZE", 10)
+    mocker.patch.object(wandb_artifacts.time, "sleep")
+    data = os.urandom(45)
+    path = str(tmpdir.join("obj"))
+
+    session = FakeRangeSession(data)
+    session.break_after[20] = 2
+    wandb_artifacts._download_url(session, "url", path, len(data))
+    assert open(path, "rb").read() == data
+    # the broken part is resumed from where it stopped
+    assert "bytes=26-29" in session.requests
+    assert not os.path.exists(path + ".parts")
+
+    # a server without range support sends the object once
+    session = FakeRangeSession(data, ranges=False)
+    wandb_artifacts._download_url(session, "url", path, len(data))
+    assert open(path, "rb").read() == data
+    assert len(session.requests) == 1
+
+
+def test_download_url_resumes(tmpdir, mocker):
+    wandb_artifacts = wandb.wandb_sdk.wandb_artifacts
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_THRESHOLD", 10)
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_PART_SIZE", 10)
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_RETRIES", 0)
+    data = os.urandom(45)
+    path = str(tmpdir.join("obj"))
+
+    session = FakeRangeSession(data)
+    session.break_after[30] = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        wandb_artifacts._download_url(session, "url", path, len(data))
+    assert os.path.exists(path + ".parts")
+
+    session = FakeRangeSession(data)
+    wandb_artifacts._download_url(session, "url", path, len(data))
+    assert open(path, "rb").read() == data
+    assert session.requests == ["bytes=30-39"]
+
+
+def test_download_url_object_changed(tmpdir, mocker):
+    wandb_artifacts = wandb.wandb_sdk.wandb_artifacts
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_THRESHOLD", 10)
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_PART_SIZE", 10)
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_RETRIES", 0)
+    data = os.urandom(45)
+    path = str(tmpdir.join("obj"))
+
+    session = FakeRangeSession(data)
+    session.break_after[30] = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        wandb_artifacts._download_url(session, "url", path, len(data))
+
+    # the parts already written are from another version of the object
+    new_data = os.urandom(45)
+    session = FakeRangeSession(new_data, etag="v2")
+    with pytest.raises(ValueError):
+        wandb_artifacts._download_url(session, "url", path, len(data))
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".parts")
+
+    wandb_artifacts._download_url(session, "url", path, len(data))
+    assert open(path, "rb").read() == new_data
+
+    # small objects are hashed as they're downloaded
+    mocker.patch.object(wandb_artifacts, "RANGE_DOWNLOAD_THRESHOLD", 100)
+    digest = base64.b64encode(hashlib.md5(new_data).digest()).decode("ascii")
+    with pytest.raises(ValueError):
+        wandb_artifacts._download_url(session, "url", path, len(data), digest="bad")
+    assert not os.path.exists(path)
+    md5_file_b64 = mocker.spy(wandb_artifacts, "md5_file_b64")
+    wandb_artifacts._download_url(session, "url", path, len(data), digest=digest)
+    assert open(path, "rb").read() == new_data
+    assert not md5_file_b64.called
+
+
+def test_list_objects_sharded():
+    wandb_artifacts = wandb.wandb_sdk.wandb_artifacts
+    tree = {
+        "data/": (["data/a"], ["data/x/", "data/y/"]),
+        "data/x/": (["data/x/b", "data/x/c"], ["data/x/z/"]),
+        "data/x/z/": (["data/x/z/d"], []),
+        "data/y/": ([], []),
+    }
+    listed = []
+
+    def list_dir(prefix, max_items):
+        listed.append(prefix)
+        yield tree[prefix]
+
+    objects = wandb_artifacts._list_objects_sharded(list_dir, "data/", 100)
+    assert sorted(objects) == ["data/a", "data/x/b", "data/x/c", "data/x/z/d"]
+    assert sorted(listed) == sorted(tree)
+    objects = wandb_artifacts._list_objects_sharded(list_dir, "data/", 2)
+    assert len(list(objects)) == 2
+
+
+def test_list_objects_sharded_huge_dir():
+    wandb_artifacts = wandb.wandb_sdk.wandb_artifacts
+    pages = []
+
+    def list_dir(prefix, max_items):
+        assert max_items == 25
+        # a directory with more objects than anyone would list
+        for page in itertools.count():
+            pages.append(page)
+            yield ["data/%i-%i" % (page, i) for i in range(10)], []
+
+    objects = list(wandb_artifacts._list_objects_sharded(list_dir, "data/", 25))
+    assert len(objects) == 25
+    assert objects[-1] == "data/2-4"
+    assert len(pages) < 3 + 2 * wandb_artifacts.LIST_WORKERS
+
+
+class LocalArtifactEntry(object):
+    def __init__(self, entry):
+        self.entry = entry
+
+    def download(self):
+        return self.entry.local_path
+
+
+def test_add_obj_wbtable_columnar(runner, mocker):
+    mocker.patch.object(wandb.Table, "COLUMNAR_MIN_ROWS", 2)
+    mocker.patch.object(wandb.Table, "MAX_ARTIFACT_ROWS", 2)
+    with runner.isolated_filesystem():
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        data = [
+            [1, 0.5, "a", True, [1]],
+            [2, None, "b", False, None],
+            [3, 2, None, True, [2, 3]],
+        ]
+        table = wandb.Table(columns=["i", "f", "s", "b", "d"], data=data)
+        artifact.add(table, "my-table")
+
+        entries = artifact.manifest.entries
+        (npz_path,) = [p for p in entries if p.endswith(".table.npz")]
+        with open(entries["my-table.table.json"].local_path) as f:
+            table_json = json.load(f)
+        # readers that don't know the columnar format get the first rows
+        assert table_json["data"] == data[:2]
+        assert table_json["nrows"] == 3
+        assert table_json["columnar"]["path"] == npz_path
+        assert list(table_json["columnar"]["json_columns"]) == ["4"]
+
+        source_artifact = mocker.Mock()
+        source_artifact.get_path.side_effect = lambda p: LocalArtifactEntry(entries[p])
+        loaded = wandb.Table.from_json(table_json, source_artifact)
+        assert not source_artifact.get_path.called
+        assert loaded.data == data
+        assert isinstance(loaded.data[0][0], int)
+        assert loaded._column_types == table._column_types
+
+
+def test_add_obj_wbtable_columnar_strings(runner, mocker):
+    mocker.patch.object(wandb.Table, "COLUMNAR_MIN_ROWS", 2)
+    with runner.isolated_filesystem():
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        data = [["a\x00", "a" * 1000, "x"]] + [["b", "b", "y"]] * 9
+        table = wandb.Table(columns=["nul", "long", "short"], data=data)
+        artifact.add(table, "my-table")
+
+        entries = artifact.manifest.entries
+        with open(entries["my-table.table.json"].local_path) as f:
+            table_json = json.load(f)
+        assert sorted(table_json["columnar"]["json_columns"]) == ["0", "1"]
+
+        source_artifact = mocker.Mock()
+        source_artifact.get_path.side_effect = lambda p: LocalArtifactEntry(entries[p])
+        assert wandb.Table.from_json(table_json, source_artifact).data == data
+
+
+def test_add_dir_broken_symlink(runner):
+    with runner.isolated_filesystem():
+        os.mkdir("data")
+        open("data/a.txt", "w").write("a")
+        os.symlink("missing.txt", "data/b.txt")
+        artifact = wandb.Artifact(type="dataset", name="my-arty")
+        with pytest.raises(OSError):
+            artifact.add_dir("data")
@@ -1,13 +1,15 @@
+import atexit
 import datetime
+import fnmatch
 from functools import partial
 import json
 import logging
 import os
 import platform
 import re
-import shutil
 import sys
 import tempfile
+import threading
 import time
 
 from gql import Client, gql
@@ -2424,6 +2426,53 @@ class ArtifactCollection(object):
         return "<ArtifactCollection {} ({})>".format(self.name, self.type)
 
 
+# Artifact files downloaded at once, shared by every download in the process
+ARTIFACT_DOWNLOAD_WORKERS = 32
+
+_download_pool = None
+_download_pool_lock = threading.Lock()
+
+
+def _run_downloads(jobs):
+    """Runs (size, fn) download jobs on the process wide download pool.
+
+    Smaller files are started first so the first files are ready to use soon.
+    Every job is waited for before the first error is raised, so nothing is
+    left writing files once this returns. Must not be called from a download
+    job, which would wait on its own pool.
+    """
+    global _download_pool
+    with _download_pool_lock:
+        if _download_pool is None:
+            import multiprocessing.dummy  # this uses threads
+
+            _download_pool = multiprocessing.dummy.Pool(ARTIFACT_DOWNLOAD_WORKERS)
+            # A pool left to __del__ at interpreter shutdown errors out
+            atexit.register(_close_download_pool)
+        pool = _download_pool
+    jobs = sorted(jobs, key=lambda job: job[0])
+    errors = [e for e in pool.map(_run_download, jobs, chunksize=1) if e is not None]
+    if errors:
+        raise errors[0]
+
+
+def _run_download(job):
+    try:
+        job[1]()
+    except Exception as e:
+        return e
+    return None
+
+
+def _close_download_pool():
+    global _download_pool
+    with _download_pool_lock:
+        pool, _download_pool = _download_pool, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
 class Artifact(object):
     QUERY = gql(
         """
@@ -2480,8 +2529,8 @@ class Artifact(object):
             ]
             with requests.get(index_file_url) as req:
                 req.raise_for_status()
-                artifact._manifest = artifacts.ArtifactManifest.from_manifest_json(
-                    artifact, json.loads(six.ensure_text(req.content))
+                artifact._manifest = artifacts.ArtifactManifest.from_manifest_text(
+                    artifact, six.ensure_text(req.content)
                 )
 
             artifact._load_dependent_manifests()
@@ -2508,6 +2557,7 @@ class Artifact(object):
         ]
         self._manifest = None
         self._is_downloaded = False
+        self._download_lock = threading.Lock()
         self._dependent_artifacts = []
         artifacts.get_artifacts_cache().store_artifact(self)
 
@@ -2689,7 +2739,7 @@ class Artifact(object):
                 self.entry = entry
 
             @staticmethod
-            def copy(cache_path, target_path):
+            def copy(cache_path, target_path, link_mode="auto"):
                 # can't have colons in Windows
                 if platform.system() == "Windows":
                     head, tail = os.path.splitdrive(target_path)
@@ -2701,24 +2751,42 @@ class Artifact(object):
                 )
                 if need_copy:
                     util.mkdir_exists_ok(os.path.dirname(target_path))
-                    # We use copy2, which preserves file metadata including modified
-                    # time (which we use above to check whether we should do the copy).
-                    shutil.copy2(cache_path, target_path)
+                    # This preserves the modified time, which we use above to check
+                    # whether we should do the copy.
+                    strategy = util.materialize_file(cache_path, target_path, link_mode)
+                    if strategy == "symlink":
+                        # Evicting the object would leave the link dangling
+                        target_path = os.path.abspath(target_path)
+                        artifacts.get_artifacts_cache().pin(
+                            cache_path, target_path, link=target_path
+                        )
                 return target_path
 
             @staticmethod
-            def download(root=None):
-                root = root or default_root
+            def cache_path():
                 if entry.ref is not None:
-                    cache_path = storage_policy.load_reference(
+                    return storage_policy.load_reference(
                         parent_self, name, manifest.entries[name], local=True
                     )
-                else:
-                    cache_path = storage_policy.load_file(
-                        parent_self, name, manifest.entries[name]
-                    )
+                return storage_policy.load_file(
+                    parent_self, name, manifest.entries[name]
+                )
+
+            @staticmethod
+            def download(root=None, link_mode="auto"):
+                """Downloads the file to `root`.
 
-                return ArtifactEntry().copy(cache_path, os.path.join(root, name))
+                `link_mode` is how the file is made from its copy in the cache, one
+                of "auto", "reflink", "hardlink", "symlink" or "copy". Hardlinked
+                and symlinked files are read-only.
+                """
+                root = root or default_root
+                if parent_self._manifest_entry_is_artifact_reference(entry):
+                    # Don't link to, and lock, the other artifact's download
+                    link_mode = "copy"
+                return ArtifactEntry().copy(
+                    ArtifactEntry.cache_path(), os.path.join(root, name), link_mode
+                )
 
             @staticmethod
             def ref():
@@ -2759,8 +2827,12 @@ class Artifact(object):
             # Since tables are likely to download many other assets in artifact(s), we eagerly download
             # the artifact using the parallelized `artifact.download`. In the future, we should refactor
             # the deserialization pattern such that this special case is not needed.
-            if wb_class == wandb.Table:
-                self.download(recursive=True)
+            if wb_class == wandb.Table and not self._is_downloaded:
+                # Tables can be loaded in parallel, e.g. the parts of a
+                # PartitionedTable, only one of them downloads the artifact
+                with self._download_lock:
+                    if not self._is_downloaded:
+                        self.download(recursive=True)
 
             # Get the ArtifactEntry
             item = self.get_path(entry.path)
@@ -2775,7 +2847,32 @@ class Artifact(object):
             result.artifact_source = {"artifact": self, "name": name}
             return result
 
-    def download(self, root=None, recursive=False):
+    def open(self, name, mode="r"):
+        """Opens the file at `name` for reading.
+
+        Only this file is fetched, into the artifacts cache, so it is a cheap
+        way to read a few files out of a large artifact.
+
+        Arguments:
+            name (str): path of the file in the artifact.
+            mode (str, optional): "r" or "rb".
+
+        Returns:
+            A file object reading the cached copy of the file.
+        """
+        if mode not in ("r", "rb"):
+            raise ValueError("Artifact files can only be opened for reading")
+        return open(self.get_path(name).cache_path(), mode)
+
+    def download(
+        self,
+        root=None,
+        recursive=False,
+        path_prefix=None,
+        include=None,
+        exclude=None,
+        link_mode="auto",
+    ):
         """Download the artifact to dir specified by the <root>
 
         Arguments:
@@ -2784,14 +2881,51 @@ class Artifact(object):
             recursive (bool, optional): if set to true, then all dependent artifacts are
                 eagerly downloaded as well. If false, then the dependent artifact will
                 only be downloaded when needed.
+            path_prefix (str, optional): only download files whose path in the
+                artifact starts with this prefix, e.g. "train/shard-3/".
+            include (list, optional): only download files whose path matches one of
+                these glob patterns. `*` matches across directories.
+            exclude (list, optional): skip files whose path matches one of these
+                glob patterns.
+            link_mode (str, optional): how files are made from their copy in the
+                artifacts cache: "reflink", "hardlink", "symlink" or "copy".
+                Hardlinked and symlinked files share the cached object and are
+                read-only. The default, "auto", uses a reflink where the
+                filesystem supports it and copies otherwise.
 
         Returns:
             The path to the downloaded contents.
         """
         dirpath = root or self._default_root()
         manifest = self._load_manifest()
-        nfiles = len(manifest.entries)
-        size = sum(e.size for e in manifest.entries.values())
+        entries = self._select_entries(manifest, path_prefix, include, exclude)
+        # Force all the files to download into the same directory.
+        jobs = [
+            (
+                e.size or 0,
+                partial(self._download_file, e.path, dirpath, link_mode=link_mode),
+            )
+            for e in entries
+        ]
+        if recursive:
+            # Dependent artifacts share the download budget instead of
+            # blocking a download thread each
+            for artifact in self._unique_dependent_artifacts():
+                artifact_root = artifact._default_root()
+                jobs.extend(
+                    (
+                        e.size or 0,
+                        partial(
+                            artifact._download_file,
+                            path,
+                            artifact_root,
+                            link_mode=link_mode,
+                        ),
+                    )
+                    for path, e in six.iteritems(artifact._load_manifest().entries)
+                )
+        nfiles = len(jobs)
+        size = sum(job[0] for job in jobs)
         log = False
         if nfiles > 5000 or size > 50 * 1024 * 1024:
             termlog(
@@ -2799,23 +2933,24 @@ class Artifact(object):
                 % (self.artifact_name, size / (1024 * 1024), nfiles),
                 newline=False,
             )
+            log = True
         start_time = time.time()
 
-        # Force all the files to download into the same directory.
-        # Download in parallel
-        import multiprocessing.dummy  # this uses threads
+        _run_downloads(jobs)
 
-        pool = multiprocessing.dummy.Pool(32)
-        pool.map(partial(self._download_file, root=dirpath), manifest.entries)
+        if len(entries) == len(manifest.entries):
+            self._is_downloaded = True
         if recursive:
-            pool.map(lambda artifact: artifact.download(), self._dependent_artifacts)
-        pool.close()
-        pool.join()
-
-        self._is_downloaded = True
+            for artifact in self._unique_dependent_artifacts():
+                artifact._is_downloaded = True
 
         if log:
-            termlog("Done. %.1fs" % (time.time() - start_time), prefix=False)
+            elapsed = time.time() - start_time
+            termlog(
+                "Done. %.1fs, %.1fMB/s"
+                % (elapsed, size / (1024 * 1024) / max(elapsed, 0.001)),
+                prefix=False,
+            )
 
         return dirpath
 
@@ -2842,9 +2977,35 @@ class Artifact(object):
 
         return self._download_file(list(manifest.entries)[0], root=root)
 
-    def _download_file(self, name, root):
+    def _unique_dependent_artifacts(self):
+        # _dependent_artifacts has an artifact once per entry referencing it
+        return list({a.id: a for a in self._dependent_artifacts}.values())
+
+    @staticmethod
+    def _select_entries(manifest, path_prefix=None, include=None, exclude=None):
+        if path_prefix:
+            entries = manifest.get_entries_with_prefix(
+                util.to_forward_slash_path(path_prefix)
+            )
+        else:
+            entries = list(manifest.entries.values())
+        if include is not None:
+            entries = [
+                e
+                for e in entries
+                if any(fnmatch.fnmatchcase(e.path, pattern) for pattern in include)
+            ]
+        if exclude:
+            entries = [
+                e
+                for e in entries
+                if not any(fnmatch.fnmatchcase(e.path, pattern) for pattern in exclude)
+            ]
+        return entries
+
+    def _download_file(self, name, root, link_mode="auto"):
         # download file into cache and copy to target dir
-        return self.get_path(name).download(root)
+        return self.get_path(name).download(root, link_mode)
 
     def _default_root(self):
         root = os.path.join(".", "artifacts", self.name)
@@ -2893,32 +3054,70 @@ class Artifact(object):
         )
         return True
 
-    def verify(self, root=None):
+    def verify(self, root=None, fast=False, num_workers=None, fail_fast=False):
         """Verify an artifact by checksumming its downloaded contents.
 
-        Raises a ValueError if the verification fails. Does not verify downloaded
-        reference files.
+        Raises a ValueError listing the files that are missing or don't match the
+        manifest. Does not verify downloaded reference files.
 
         Arguments:
             root (str, optional): directory to download artifact to. If None
                 artifact will be downloaded to './artifacts/<self.name>/'
+            fast (bool, optional): reuse the digests of files whose size and
+                modification time haven't changed since they were last hashed,
+                instead of hashing every file.
+            num_workers (int, optional): how many files to hash in parallel,
+                defaults to the number of CPUs.
+            fail_fast (bool, optional): stop at the first bad file.
         """
         dirpath = root
         if dirpath is None:
             dirpath = os.path.join(".", "artifacts", self.name)
         manifest = self._load_manifest()
-        ref_count = 0
-        for entry in manifest.entries.values():
-            if entry.ref is None:
-                if (
-                    artifacts.md5_file_b64(os.path.join(dirpath, entry.path))
-                    != entry.digest
-                ):
-                    raise ValueError("Digest mismatch for file: %s" % entry.path)
-            else:
-                ref_count += 1
+        entries = [e for e in manifest.entries.values() if e.ref is None]
+        ref_count = len(manifest.entries) - len(entries)
+
+        import multiprocessing.dummy  # this uses threads
+
+        # hashlib releases the GIL, so threads hash files in parallel
+        pool = multiprocessing.dummy.Pool(num_workers or multiprocessing.cpu_count())
+        failures = []
+        try:
+            for failure in pool.imap_unordered(
+                partial(self._verify_entry, dirpath, fast), entries
+            ):
+                if failure is not None:
+                    failures.append(failure)
+                    if fail_fast:
+                        break
+        finally:
+            pool.terminate()
+            pool.join()
         if ref_count > 0:
             print("Warning: skipped verification of %s refs" % ref_count)
+        if failures:
+            failures.sort()
+            lines = ["%s: %s" % failure for failure in failures[:20]]
+            if len(failures) > 20:
+                lines.append("... and %i more" % (len(failures) - 20))
+            raise ValueError(
+                "Verification failed for %i of %i files:\n  %s"
+                % (len(failures), len(entries), "\n  ".join(lines))
+            )
+
+    @staticmethod
+    def _verify_entry(dirpath, fast, entry):
+        """Returns (path, reason) if the downloaded file doesn't match entry."""
+        path = os.path.join(dirpath, entry.path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return entry.path, "missing"
+        if entry.size is not None and size != entry.size:
+            return entry.path, "size mismatch"
+        if artifacts.md5_file_b64(path, use_cache=fast) != entry.digest:
+            return entry.path, "digest mismatch"
+        return None
 
     # TODO: not yet public, but we probably want something like this.
     def _list(self):
@@ -3016,8 +3215,8 @@ class Artifact(object):
             ]
             with requests.get(index_file_url) as req:
                 req.raise_for_status()
-                self._manifest = artifacts.ArtifactManifest.from_manifest_json(
-                    self, json.loads(six.ensure_text(req.content))
+                self._manifest = artifacts.ArtifactManifest.from_manifest_text(
+                    self, six.ensure_text(req.content)
                 )
 
             self._load_dependent_manifests()
@@ -1219,6 +1219,31 @@ def get(path, root, type):
         raise ClickException("Unable to download artifact")
 
 
+@artifact.command(
+    "verify",
+    context_settings=CONTEXT,
+    help="Verify the downloaded files of an artifact against its manifest",
+)
+@click.argument("path")
+@click.option("--root", help="The directory the artifact was downloaded to")
+@click.option("--type", help="The type of artifact you are verifying")
+@click.option(
+    "--fast",
+    is_flag=True,
+    default=False,
+    help="Skip rehashing files that haven't changed since they were last hashed",
+)
+@display_error
+def verify_artifact(path, root, type, fast):
+    public_api = PublicApi()
+    artifact = public_api.artifact(path, type=type)
+    try:
+        artifact.verify(root=root, fast=fast)
+    except ValueError as e:
+        raise ClickException(str(e))
+    wandb.termlog("Artifact %s verified" % artifact.name)
+
+
 @artifact.command(
     context_settings=CONTEXT, help="List all artifacts in a wandb project"
 )
@@ -1255,6 +1280,31 @@ def ls(path, type):
             )
 
 
+@artifact.group(help="Commands for interacting with the artifact cache")
+def cache():
+    pass
+
+
+@cache.command(
+    context_settings=CONTEXT,
+    help="Clean up less frequently used files from the artifacts cache",
+)
+@click.option(
+    "--target-size",
+    required=True,
+    help="The maximum size the cache should be left at, e.g. 10GB",
+)
+@display_error
+def cleanup(target_size):
+    try:
+        target_size = util.parse_size(target_size)
+    except ValueError as e:
+        raise ClickException(str(e))
+    artifacts_cache = wandb_sdk.interface.artifacts.get_artifacts_cache()
+    reclaimed = artifacts_cache.cleanup(target_size)
+    wandb.termlog("Reclaimed %s of space" % util.sizeof_fmt(reclaimed))
+
+
 @cli.command(context_settings=CONTEXT, help="Pull files from Weights & Biases")
 @click.argument("run", envvar=env.RUN_ID)
 @click.option(
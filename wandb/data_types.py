@@ -11,9 +11,11 @@ from __future__ import print_function
 import base64
 import binascii
 import codecs
+import collections
 import hashlib
 import json
 import logging
+import multiprocessing.dummy
 import numbers
 import os
 import pprint
@@ -491,6 +493,9 @@ class Table(Media):
 
     MAX_ROWS = 10000
     MAX_ARTIFACT_ROWS = 200000
+    # Tables added to artifacts with at least this many rows store their
+    # columns in a NumPy .npz file, which isn't capped at MAX_ARTIFACT_ROWS
+    COLUMNAR_MIN_ROWS = MAX_ARTIFACT_ROWS + 1
     artifact_type = "table"
 
     def __init__(
@@ -504,6 +509,8 @@ class Table(Media):
     ):
         """rows is kept for legacy reasons, we use data to mimic the Pandas api"""
         super(Table, self).__init__()
+        self._columnar_source = None
+        self._native_columns = None
 
         # This is kept for legacy reasons (tss: personally, I think we should remove this)
         if columns is None:
@@ -530,6 +537,31 @@ class Table(Media):
             else:
                 self._init_from_list([], columns, optional, dtype)
 
+    @property
+    def data(self):
+        if self._columnar_source is not None:
+            self._native_columns = self._load_columnar(*self._columnar_source)
+            self._columnar_source = None
+        if self._native_columns is not None:
+            columns = [
+                c.tolist() if util.is_numpy_array(c) else c
+                for c in self._native_columns
+            ]
+            self._data = [list(row) for row in zip(*columns)]
+            self._native_columns = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._columnar_source = None
+        self._native_columns = None
+        self._data = data
+
+    def _num_rows(self):
+        if self._native_columns:
+            return len(self._native_columns[0])
+        return len(self.data)
+
     @staticmethod
     def _assert_valid_columns(columns):
         valid_col_types = [str, int]
@@ -557,8 +589,23 @@ class Table(Media):
         self._assert_valid_columns(columns)
         self.columns = columns
         self._make_column_types(dtype, optional)
-        for row in ndarray.tolist():
-            self.add_data(*row)
+        if ndarray.ndim != 2:
+            for row in ndarray.tolist():
+                self.add_data(*row)
+            return
+        if ndarray.shape[1] != len(self.columns):
+            raise ValueError(
+                "This table expects {} columns: {}".format(
+                    len(self.columns), self.columns
+                )
+            )
+        # Columns are copied, they'd otherwise be views of the caller's array
+        self._init_from_columns(
+            [
+                c.copy() if _is_native_column(c) else c.tolist()
+                for c in (ndarray[:, ndx] for ndx in range(ndarray.shape[1]))
+            ]
+        )
 
     def _init_from_dataframe(self, dataframe, columns, optional=True, dtype=None):
         assert util.is_pandas_data_frame(
@@ -567,8 +614,37 @@ class Table(Media):
         self.data = []
         self.columns = list(dataframe.columns)
         self._make_column_types(dtype, optional)
-        for row in range(len(dataframe)):
-            self.add_data(*tuple(dataframe[col].values[row] for col in self.columns))
+        # Columns are copied, they'd otherwise share the dataframe's buffers
+        self._init_from_columns(
+            [
+                c.copy() if _is_native_column(c) else list(c)
+                for c in (dataframe[col].values for col in self.columns)
+            ]
+        )
+
+    def _init_from_columns(self, columns):
+        """Keeps the columns as they are, rows are only built once data is accessed.
+
+        Columns of numbers, strings or bools are numpy arrays typed from their
+        dtype, other columns are lists typed cell by cell.
+        """
+        type_map = self._column_types.params["type_map"]
+        for col_name, values in zip(self.columns, columns):
+            wbtype = type_map[col_name]
+            if util.is_numpy_array(values):
+                # All the cells of the array share the type of the first one
+                values = values[:1].tolist()
+            for v in values:
+                result_type = wbtype.assign(v)
+                if isinstance(result_type, _dtypes.InvalidType):
+                    raise TypeError(
+                        "Data in column {} contained incompatible types:\n{}".format(
+                            col_name, wbtype.explain(v)
+                        )
+                    )
+                wbtype = result_type
+            type_map[col_name] = wbtype
+        self._native_columns = columns
 
     def _make_column_types(self, dtype=None, optional=True):
         if dtype is None:
@@ -650,12 +726,19 @@ class Table(Media):
             )
         self._column_types = result_type
 
-    def _to_table_json(self, max_rows=None):
+    def _to_table_json(self, max_rows=None, warn_truncate=True):
         # seperate method for testing
         if max_rows is None:
             max_rows = Table.MAX_ROWS
-        if len(self.data) > max_rows:
+        if warn_truncate and self._num_rows() > max_rows:
             logging.warning("Truncating wandb.Table object to %i rows." % max_rows)
+        if self._native_columns is not None:
+            # Only build the rows that are kept
+            columns = [
+                c[:max_rows].tolist() if util.is_numpy_array(c) else c[:max_rows]
+                for c in self._native_columns
+            ]
+            return {"columns": self.columns, "data": [list(r) for r in zip(*columns)]}
         return {"columns": self.columns, "data": self.data[:max_rows]}
 
     def bind_to_run(self, *args, **kwargs):
@@ -670,28 +753,98 @@ class Table(Media):
     def get_media_subdir(cls):
         return os.path.join("media", "table")
 
+    @staticmethod
+    def _cell_from_json(item, source_artifact):
+        if isinstance(item, dict):
+            obj = WBValue.init_from_json(item, source_artifact)
+            if obj is not None:
+                return obj
+        return item
+
     @classmethod
     def from_json(cls, json_obj, source_artifact):
+        column_types = _dtypes.TypeRegistry.type_from_dict(
+            json_obj["column_types"], source_artifact
+        )
+        if "columnar" in json_obj:
+            # The rows are only read from the .npz file once data is accessed
+            new_obj = cls(json_obj["columns"])
+            new_obj._column_types = column_types
+            new_obj._columnar_source = (json_obj["columnar"], source_artifact)
+            return new_obj
+
         data = []
         for row in json_obj["data"]:
-            row_data = []
-            for item in row:
-                cell = item
-                if isinstance(item, dict):
-                    obj = WBValue.init_from_json(item, source_artifact)
-                    if obj is not None:
-                        cell = obj
-                row_data.append(cell)
-            data.append(row_data)
+            data.append([cls._cell_from_json(item, source_artifact) for item in row])
 
         new_obj = cls(json_obj["columns"], data=data,)
-
-        new_obj._column_types = _dtypes.TypeRegistry.type_from_dict(
-            json_obj["column_types"], source_artifact
-        )
+        new_obj._column_types = column_types
 
         return new_obj
 
+    def _load_columnar(self, columnar, source_artifact):
+        """Reads the columns of the table from its .npz file."""
+        np = util.get_module(
+            "numpy", required="Loading columnar wandb.Table requires numpy"
+        )
+        path = source_artifact.get_path(columnar["path"]).download()
+        columns = []
+        with np.load(path, allow_pickle=False) as arrays:
+            for ndx in range(len(self.columns)):
+                key = str(ndx)
+                if key in columnar["json_columns"]:
+                    columns.append(
+                        [
+                            self._cell_from_json(item, source_artifact)
+                            for item in columnar["json_columns"][key]
+                        ]
+                    )
+                    continue
+                values = arrays["c%i" % ndx]
+                if "m%i" % ndx in arrays.files:
+                    mask = arrays["m%i" % ndx].tolist()
+                    values = [None if m else v for v, m in zip(values.tolist(), mask)]
+                columns.append(values)
+        return columns
+
+    def _to_columnar_json(self, artifact, cell_to_json):
+        """Writes the cells of each column into an .npz file in the artifact.
+
+        Columns of numbers, strings or bools are stored as arrays, with a mask
+        array for missing values. Other columns, and strings that don't fit a
+        fixed width array well, are kept as JSON lists.
+        """
+        np = util.get_module("numpy")
+        arrays = {}
+        json_columns = {}
+        for ndx in range(len(self.columns)):
+            if self._native_columns is not None and _is_native_column(
+                self._native_columns[ndx]
+            ):
+                arrays["c%i" % ndx] = self._native_columns[ndx]
+                continue
+            if self._native_columns is not None:
+                values = self._native_columns[ndx]
+            else:
+                values = [row[ndx] for row in self.data]
+            column = _column_to_arrays(np, values)
+            if column is None:
+                json_columns[str(ndx)] = [cell_to_json(v) for v in values]
+                continue
+            arrays["c%i" % ndx], mask = column
+            if mask is not None:
+                arrays["m%i" % ndx] = mask
+
+        tmp_path = os.path.join(MEDIA_TMP.name, util.generate_id() + ".table.npz")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        entry = artifact.add_file(
+            tmp_path,
+            name=os.path.join(self.get_media_subdir(), os.path.basename(tmp_path)),
+            is_tmp=True,
+        )
+        return {"path": entry.path, "json_columns": json_columns}
+
     def to_json(self, run_or_artifact):
         json_dict = super(Table, self).to_json(run_or_artifact)
         wandb_run, wandb_artifacts = _safe_sdk_import()
@@ -701,7 +854,7 @@ class Table(Media):
                 {
                     "_type": "table-file",
                     "ncols": len(self.columns),
-                    "nrows": len(self.data),
+                    "nrows": self._num_rows(),
                 }
             )
 
@@ -714,8 +867,6 @@ class Table(Media):
                         )
                     )
             artifact = run_or_artifact
-            mapped_data = []
-            data = self._to_table_json(Table.MAX_ARTIFACT_ROWS)["data"]
 
             def json_helper(val):
                 if isinstance(val, WBValue):
@@ -728,18 +879,40 @@ class Table(Media):
                 else:
                     return util.json_friendly(val)[0]
 
-            for row in data:
+            json_columns = {}
+            columnar = (
+                self._num_rows() >= Table.COLUMNAR_MIN_ROWS
+                and util.get_module("numpy") is not None
+            )
+            if columnar:
+                columnar_json = self._to_columnar_json(artifact, json_helper)
+                json_dict.update({"columnar": columnar_json, "nrows": self._num_rows()})
+                # Cells of JSON columns are already serialized for the preview
+                for key, values in six.iteritems(columnar_json["json_columns"]):
+                    json_columns[int(key)] = values
+
+            # Columnar tables keep the first rows as "data" too, for readers
+            # that don't know about "columnar"
+            mapped_data = []
+            data = self._to_table_json(
+                Table.MAX_ARTIFACT_ROWS, warn_truncate=not columnar
+            )["data"]
+            for i, row in enumerate(data):
                 mapped_row = []
-                for v in row:
-                    mapped_row.append(json_helper(v))
+                for ndx, v in enumerate(row):
+                    if ndx in json_columns:
+                        mapped_row.append(json_columns[ndx][i])
+                    else:
+                        mapped_row.append(json_helper(v))
                 mapped_data.append(mapped_row)
+            json_dict["data"] = mapped_data
+            if not columnar:
+                json_dict["nrows"] = len(mapped_data)
             json_dict.update(
                 {
                     "_type": Table.artifact_type,
                     "columns": self.columns,
-                    "data": mapped_data,
                     "ncols": len(self.columns),
-                    "nrows": len(mapped_data),
                     "column_types": self._column_types.to_json(artifact),
                 }
             )
@@ -761,6 +934,72 @@ class Table(Media):
             yield ndx, self.data[ndx]
 
 
+def _is_native_column(values):
+    """Whether a column can stay a numpy array rather than a list of cells."""
+    return (
+        util.is_numpy_array(values)
+        and values.ndim == 1
+        and values.dtype.kind in "biufU"
+    )
+
+
+# How many times the total length of its strings a string column can take
+# once padded to a fixed width array, above that it is stored as JSON
+STR_COLUMN_MAX_PADDING = 4
+
+
+def _column_to_arrays(np, values):
+    """Returns a (values, mask) pair of arrays for a column of plain values.
+
+    The mask is None unless the column has missing values. Returns None if the
+    column holds anything other than numbers, strings and bools.
+    """
+    kinds = set()
+    for v in values:
+        if v is None:
+            kinds.add("none")
+        elif isinstance(v, (bool, np.bool_)):
+            kinds.add("bool")
+        elif isinstance(v, six.integer_types + (np.integer,)):
+            kinds.add("int")
+        elif isinstance(v, (float, np.floating)):
+            kinds.add("float")
+        elif isinstance(v, six.string_types):
+            kinds.add("str")
+        else:
+            return None
+
+    mask = None
+    if "none" in kinds:
+        kinds.remove("none")
+        mask = np.array([v is None for v in values])
+    if kinds == {"bool"}:
+        dtype, fill = np.bool_, False
+    elif kinds == {"int"}:
+        dtype, fill = np.int64, 0
+    elif kinds and kinds <= {"int", "float"}:
+        dtype, fill = np.float64, 0.0
+    elif kinds == {"str"}:
+        strings = [v for v in values if v is not None]
+        # Fixed width arrays drop trailing NULs
+        if any(v.endswith("\x00") for v in strings):
+            return None
+        # and pad each string to the longest one, too much for mostly short ones
+        lengths = [len(v) for v in strings]
+        if max(lengths) * len(values) > STR_COLUMN_MAX_PADDING * (
+            sum(lengths) + len(values)
+        ):
+            return None
+        dtype, fill = np.unicode_, ""
+    else:
+        return None
+    try:
+        array = np.array([fill if v is None else v for v in values], dtype=dtype)
+    except OverflowError:
+        return None
+    return array, mask
+
+
 class _PartitionTablePartEntry:
     """Helper class for PartitionTable to track its parts
     """
@@ -775,6 +1014,12 @@ class _PartitionTablePartEntry:
             self._part = self.source_artifact.get(self.entry.path)
         return self._part
 
+    def load_part(self):
+        part = self.get_part()
+        # Columnar parts decode their rows on first access, do it here too
+        part.data
+        return part
+
     def free(self):
         self._part = None
 
@@ -811,8 +1056,15 @@ class PartitionedTable(Media):
             instance._add_part_entry(entry, source_artifact)
         return instance
 
-    def iterrows(self):
+    def iterrows(self, prefetch=2, max_prefetch_bytes=256 * 1024 * 1024):
         """Iterate over rows as (ndx, row)
+
+        Upcoming parts are downloaded and decoded in the background while the
+        current part is read: up to `prefetch` parts, as long as their files add
+        up to `max_prefetch_bytes`. Parts are freed once they've been read.
+        Breaking out of the loop doesn't wait for the parts being prefetched,
+        they finish loading in the background and are dropped.
+
         Yields
         ------
         index : int
@@ -820,23 +1072,52 @@ class PartitionedTable(Media):
         row : List[any]
             The data of the row
         """
+        part_entries = list(self._loaded_part_entries.values())
+        if not part_entries:
+            return
+        pool = multiprocessing.dummy.Pool(max(prefetch, 1))
+        queued = collections.deque()
+        queued_bytes = 0
+        next_part = 0
         columns = None
         ndx = 0
-        for entry_path in self._loaded_part_entries:
-            part = self._loaded_part_entries[entry_path].get_part()
-            if columns is None:
-                columns = part.columns
-            elif columns != part.columns:
-                raise ValueError(
-                    "Table parts have non-matching columns. {} != {}".format(
-                        columns, part.columns
+        try:
+            while True:
+                # Queue the current part and up to `prefetch` more
+                while next_part < len(part_entries):
+                    part_entry = part_entries[next_part]
+                    size = part_entry.entry.size or 0
+                    if queued and (
+                        len(queued) > prefetch
+                        or queued_bytes + size > max_prefetch_bytes
+                    ):
+                        break
+                    queued.append((part_entry, pool.apply_async(part_entry.load_part)))
+                    queued_bytes += size
+                    next_part += 1
+                if not queued:
+                    break
+                part_entry, result = queued.popleft()
+                queued_bytes -= part_entry.entry.size or 0
+                part = result.get()
+                if columns is None:
+                    columns = part.columns
+                elif columns != part.columns:
+                    raise ValueError(
+                        "Table parts have non-matching columns. {} != {}".format(
+                            columns, part.columns
+                        )
                     )
-                )
-            for _, row in part.iterrows():
-                yield ndx, row
-                ndx += 1
-
-            self._loaded_part_entries[entry_path].free()
+                for _, row in part.iterrows():
+                    yield ndx, row
+                    ndx += 1
+
+                part_entry.free()
+        finally:
+            # Not joined, so an early break doesn't wait for running downloads
+            pool.terminate()
+            for part_entry, _ in queued:
+                part_entry.free()
 
     def _add_part_entry(self, entry, source_artifact):
         self._loaded_part_entries[entry.path] = _PartitionTablePartEntry(
@@ -62,6 +62,7 @@ ANONYMOUS = "WANDB_ANONYMOUS"
 JUPYTER = "WANDB_JUPYTER"
 CONFIG_DIR = "WANDB_CONFIG_DIR"
 CACHE_DIR = "WANDB_CACHE_DIR"
+CACHE_MAX_SIZE = "WANDB_CACHE_MAX_SIZE"
 
 # For testing, to be removed in future version
 USE_V1_ARTIFACTS = "_WANDB_USE_V1_ARTIFACTS"
@@ -97,6 +98,7 @@ def immutable_keys():
         HTTP_TIMEOUT,
         HOST,
         CACHE_DIR,
+        CACHE_MAX_SIZE,
         USE_V1_ARTIFACTS,
     ]
 
@@ -286,6 +288,12 @@ def get_cache_dir(env=None):
     return val
 
 
+def get_cache_max_size(env=None):
+    if env is None:
+        env = os.environ
+    return env.get(CACHE_MAX_SIZE) or None
+
+
 def get_use_v1_artifacts(env=None):
     if env is None:
         env = os.environ
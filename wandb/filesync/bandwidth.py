@@ -0,0 +1,67 @@
+"""Sharing upload bandwidth between upload jobs."""
+
+import threading
+import time
+
+import wandb
+
+# Upload priority classes, lower values are sent first.
+PRIORITY_METADATA = 0
+PRIORITY_MEDIA = 1
+PRIORITY_ARTIFACT = 2
+PRIORITY_OTHER = 3
+
+
+def upload_priority(save_name, artifact_id=None):
+    """Classifies a file so run metadata isn't stuck behind a large checkpoint."""
+    if artifact_id is not None:
+        return PRIORITY_ARTIFACT
+    if wandb.wandb_lib.filenames.is_wandb_file(save_name):
+        return PRIORITY_METADATA
+    if save_name.startswith("media"):
+        return PRIORITY_MEDIA
+    return PRIORITY_OTHER
+
+
+class TokenBucket(object):
+    """A token bucket rate limiter shared by all upload jobs.
+
+    Tokens are bytes, they refill at `rate` bytes per second up to one second
+    worth of burst. Jobs of a lower priority class wait while a job of a higher
+    priority class is waiting for tokens. A rate of None disables the limit.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._tokens = float(rate or 0)
+        self._last_refill = time.time()
+        self._cond = threading.Condition()
+        self._waiting = {}
+
+    def consume(self, num_bytes, priority=PRIORITY_OTHER):
+        if not self.rate or num_bytes <= 0:
+            return
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    self._refill()
+                    # Let chunks larger than the bucket through once it's full
+                    needed = min(num_bytes, self.rate)
+                    higher_waiting = any(
+                        count > 0 and p < priority for p, count in self._waiting.items()
+                    )
+                    if not higher_waiting and self._tokens >= needed:
+                        self._tokens -= num_bytes
+                        return
+                    self._cond.wait(max(needed - self._tokens, 0) / self.rate + 0.01)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(
+            float(self.rate), self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
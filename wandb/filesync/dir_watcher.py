@@ -1,18 +1,61 @@
 import logging
 import os
-import six
-from six.moves import queue
+import re
+import sys
+import threading
 import time
+from six.moves import queue
 
 from wandb import util
 import glob
 
 wd_polling = util.vendor_import("watchdog.observers.polling")
 wd_events = util.vendor_import("watchdog.events")
+# inotify is only available on linux, and only used when the file_watcher
+# setting asks for it
+wd_inotify = None
+if sys.platform.startswith("linux"):
+    wd_inotify = util.vendor_import("watchdog.observers.inotify")
 
 logger = logging.getLogger(__file__)
 
 
+def compile_glob(pattern):
+    """Compile a glob pattern relative to the run directory into a regex.
+
+    Like `glob.glob`, wildcards don't match across directory separators.
+    """
+    pattern = util.to_forward_slash_path(os.path.normpath(pattern))
+    regex, i = "", 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            end = i
+            if pattern[end : end + 1] == "!":
+                end += 1
+            if pattern[end : end + 1] == "]":
+                end += 1
+            end = pattern.find("]", end)
+            if end == -1:
+                regex += re.escape(c)
+                continue
+            chars = pattern[i:end].replace("\\", "\\\\").replace("[", "\\[")
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            elif chars.startswith("^"):
+                chars = "\\" + chars
+            regex += "[%s]" % chars
+            i = end + 1
+        else:
+            regex += re.escape(c)
+    return re.compile(regex + r"\Z")
+
+
 class FileEventHandler(object):
     def __init__(self, file_path, save_name, api, file_pusher, *args, **kwargs):
         self.file_path = file_path
@@ -21,12 +64,22 @@ class FileEventHandler(object):
         self.save_name = save_name
         self._file_pusher = file_pusher
         self._last_sync = None
+        self._last_sync_size = None
         self._api = api
 
     @property
     def synced(self):
         return self._last_sync == os.path.getmtime(self.file_path)
 
+    def synced_with(self, stat):
+        """Whether the version of the file described by `stat` was already pushed."""
+        return (self._last_sync, self._last_sync_size) == (stat.st_mtime, stat.st_size)
+
+    def _record_sync(self, stat=None):
+        stat = stat or os.stat(self.file_path)
+        self._last_sync = stat.st_mtime
+        self._last_sync_size = stat.st_size
+
     @property
     def policy(self):
         raise NotImplementedError
@@ -39,7 +92,7 @@ class FileEventHandler(object):
         self.save_name = new_name
         self.on_modified()
 
-    def finish(self):
+    def finish(self, stat=None):
         self.on_modified(force=True)
 
 
@@ -56,9 +109,9 @@ class PolicyNow(FileEventHandler):
         # only upload if we've never uploaded or when .save is called
         if self._last_sync is None or force:
             self._file_pusher.file_changed(self.save_name, self.file_path)
-            self._last_sync = os.path.getmtime(self.file_path)
+            self._record_sync()
 
-    def finish(self):
+    def finish(self, stat=None):
         pass
 
     @property
@@ -70,10 +123,10 @@ class PolicyEnd(FileEventHandler):
     """This policy only updates at the end of the run"""
 
     # TODO: make sure we call this
-    def finish(self):
+    def finish(self, stat=None):
         # We use copy=False to avoid possibly expensive copies, and because
         # user files shouldn't still be changing at the end of the run.
-        self._last_sync = os.path.getmtime(self.file_path)
+        self._record_sync(stat)
         self._file_pusher.file_changed(self.save_name, self.file_path, copy=False)
 
     @property
@@ -138,9 +191,9 @@ class PolicyLive(FileEventHandler):
             self.save_file()
 
     def save_file(self):
-        self._last_sync = os.path.getmtime(self.file_path)
+        self._record_sync()
         self._last_uploaded_time = time.time()
-        self._last_uploaded_size = self.current_size
+        self._last_uploaded_size = self._last_sync_size
         self._file_pusher.file_changed(self.save_name, self.file_path)
 
     @property
@@ -149,21 +202,63 @@ class PolicyLive(FileEventHandler):
 
 
 class DirWatcher(object):
+    # With the file_quiescence setting, files are only pushed once they stopped
+    # changing for that many seconds, so we don't upload a checkpoint that's
+    # still being written. A file that never settles is pushed after
+    # QUIESCENCE_MAX_WAIT anyway. Off by default, no settling thread is started.
+    QUIESCENCE_SECONDS = 0
+    QUIESCENCE_MAX_WAIT = 60.0
+
     def __init__(self, settings, api, file_pusher):
         self._api = api
         self._file_count = 0
         self._dir = settings.files_dir
         self._settings = settings
         self._user_file_policies = {"end": set(), "live": set(), "now": set()}
+        self._user_file_matchers = {"live": [], "now": []}
         self._file_pusher = file_pusher
         self._file_event_handlers = {}
-        self._file_observer = wd_polling.PollingObserver()
-        self._file_observer.schedule(
-            self._per_file_event_handler(), self._dir, recursive=True
-        )
-        self._file_observer.start()
+        self._quiescence = self.QUIESCENCE_SECONDS
+        if settings.file_quiescence is not None:
+            self._quiescence = float(settings.file_quiescence)
+        # save_name -> [file_path, (mtime, size), settle deadline, push deadline]
+        self._settling = {}
+        self._settling_lock = threading.Lock()
+        self._settling_stop = threading.Event()
+        self._settling_thread = None
+        if self._quiescence > 0:
+            self._settling_thread = threading.Thread(target=self._settling_loop)
+            self._settling_thread.daemon = True
+            self._settling_thread.start()
+        self._file_observer = self._start_observer()
         logger.info("watching files in: %s", settings.files_dir)
 
+    def _start_observer(self):
+        """Start a polling observer, or an inotify one if the settings ask for it.
+
+        Delivering an inotify event costs more CPU than a polling scan does per
+        file, so inotify only pays off for large and mostly idle run directories.
+        It can also fail to start when we run out of watches or instances
+        (ENOSPC / EMFILE), then we fall back to polling.
+        """
+        if wd_inotify is not None and self._settings.file_watcher == "inotify":
+            observer = wd_inotify.InotifyObserver()
+            observer.schedule(self._per_file_event_handler(), self._dir, recursive=True)
+            try:
+                observer.start()
+                return observer
+            except OSError as e:
+                logger.warning("inotify unavailable, polling for file changes: %s", e)
+                observer.unschedule_all()
+        observer = wd_polling.PollingObserver()
+        observer.schedule(self._per_file_event_handler(), self._dir, recursive=True)
+        observer.start()
+        return observer
+
+    @property
+    def polling(self):
+        return isinstance(self._file_observer, wd_polling.PollingObserver)
+
     @property
     def emitter(self):
         try:
@@ -172,7 +267,10 @@ class DirWatcher(object):
             return None
 
     def update_policy(self, path, policy):
-        self._user_file_policies[policy].add(path)
+        if path not in self._user_file_policies[policy]:
+            self._user_file_policies[policy].add(path)
+            if policy in self._user_file_matchers:
+                self._user_file_matchers[policy].append(compile_glob(path))
         for src_path in glob.glob(os.path.join(self._dir, path)):
             save_name = os.path.relpath(src_path, self._dir)
             feh = self._get_file_event_handler(src_path, save_name)
@@ -215,19 +313,70 @@ class DirWatcher(object):
             return None
         self._file_count += 1
         # We do the directory scan less often as it grows
-        if self._file_count % 100 == 0:
+        if self.polling and self._file_count % 100 == 0:
             emitter = self.emitter
             if emitter:
                 emitter._timeout = int(self._file_count / 100) + 1
         save_name = os.path.relpath(event.src_path, self._dir)
-        self._get_file_event_handler(event.src_path, save_name).on_modified()
+        self._file_changed(event.src_path, save_name)
 
     def _on_file_modified(self, event):
         logger.info("file/dir modified: %s", event.src_path)
         if os.path.isdir(event.src_path):
             return None
         save_name = os.path.relpath(event.src_path, self._dir)
-        self._get_file_event_handler(event.src_path, save_name).on_modified()
+        self._file_changed(event.src_path, save_name)
+
+    def _file_changed(self, file_path, save_name):
+        handler = self._get_file_event_handler(file_path, save_name)
+        # end policy files are only pushed by finish, nothing to wait for
+        if self._settling_thread is None or handler.policy == "end":
+            handler.on_modified()
+            return
+        now = time.time()
+        with self._settling_lock:
+            pending = self._settling.get(save_name)
+            if pending is None:
+                self._settling[save_name] = [
+                    file_path,
+                    None,
+                    now + self._quiescence,
+                    now + self.QUIESCENCE_MAX_WAIT,
+                ]
+            else:
+                pending[0] = file_path
+                pending[2] = now + self._quiescence
+
+    def _settling_loop(self):
+        while not self._settling_stop.wait(self._quiescence / 4):
+            self._push_settled()
+
+    def _push_settled(self, flush=False):
+        """Push files that haven't changed for the quiescence window."""
+        now = time.time()
+        settled = []
+        with self._settling_lock:
+            for save_name, pending in list(self._settling.items()):
+                file_path, last_stat, settle_deadline, push_deadline = pending
+                try:
+                    st = os.stat(file_path)
+                    stat = (st.st_mtime, st.st_size)
+                except OSError:
+                    stat = None
+                if stat != last_stat:
+                    pending[1] = stat
+                    pending[2] = settle_deadline = max(
+                        settle_deadline, now + self._quiescence
+                    )
+                if flush or now >= min(settle_deadline, push_deadline):
+                    del self._settling[save_name]
+                    if stat is not None:
+                        settled.append((file_path, save_name))
+        for file_path, save_name in settled:
+            try:
+                self._get_file_event_handler(file_path, save_name).on_modified()
+            except OSError as e:
+                logger.warning("couldn't push %s: %s", save_name, e)
 
     def _on_file_moved(self, event):
         # TODO: test me...
@@ -258,23 +407,21 @@ class DirWatcher(object):
                 )
             else:
                 Handler = PolicyEnd
-                for policy, globs in six.iteritems(self._user_file_policies):
-                    if policy == "end":
-                        continue
-                    # Convert set to list to avoid RuntimeError's
-                    # TODO: we may need to add locks
-                    for g in list(globs):
-                        paths = glob.glob(os.path.join(self._dir, g))
-                        if any(save_name in p for p in paths):
-                            if policy == "live":
-                                Handler = PolicyLive
-                            elif policy == "now":
-                                Handler = PolicyNow
+                name = util.to_forward_slash_path(save_name)
+                # "now" takes precedence over "live" if a file matches both
+                for policy, PolicyHandler in (("now", PolicyNow), ("live", PolicyLive)):
+                    if any(m.match(name) for m in self._user_file_matchers[policy]):
+                        Handler = PolicyHandler
+                        break
                 self._file_event_handlers[save_name] = Handler(
                     file_path, save_name, self._api, self._file_pusher
                 )
         return self._file_event_handlers[save_name]
 
+    def _wait_for_inotify_events(self):
+        """inotify events are held back briefly to pair up moves, let them through."""
+        time.sleep(wd_inotify.InotifyBuffer.delay + 0.1)
+
     def finish(self):
         logger.info("shutting down directory watcher")
         try:
@@ -284,10 +431,13 @@ class DirWatcher(object):
                 # with `queue_events`, then iterate through all events before stopping
                 # the observer to catch all files written.  First we need to prevent the
                 # existing thread from consuming our final events, then we process them
+                if not self.polling:
+                    self._wait_for_inotify_events()
                 self._file_observer._timeout = 0
                 self._file_observer._stopped_event.set()
                 self._file_observer.join()
-                self.emitter.queue_events(0)
+                if self.polling:
+                    self.emitter.queue_events(0)
                 while True:
                     try:
                         self._file_observer.dispatch_events(
@@ -304,13 +454,21 @@ class DirWatcher(object):
         except SystemError:
             pass
 
+        # The run is over, files still settling won't change anymore
+        if self._settling_thread is not None:
+            self._settling_stop.set()
+            self._settling_thread.join()
+            self._push_settled(flush=True)
+
         # Ensure we've at least noticed every file in the run directory. Sometimes
         # we miss things because asynchronously watching filesystems isn't reliable.
+        # Files whose current version was already pushed are left alone.
         logger.info("scan: %s", self._dir)
 
-        for dirpath, _, filenames in os.walk(self._dir):
-            for fname in filenames:
-                file_path = os.path.join(dirpath, fname)
-                save_name = os.path.relpath(file_path, self._dir)
-                logger.info("scan save: %s %s", file_path, save_name)
-                self._get_file_event_handler(file_path, save_name).finish()
+        for file_path, stat in util.scan_files(self._dir):
+            save_name = os.path.relpath(file_path, self._dir)
+            handler = self._file_event_handlers.get(save_name)
+            if handler is not None and handler.synced_with(stat):
+                continue
+            logger.info("scan save: %s %s", file_path, save_name)
+            self._get_file_event_handler(file_path, save_name).finish(stat)
@@ -30,6 +30,11 @@ class Stats(object):
         self._stats[save_name]["uploaded"] = 0
         self._stats[save_name]["failed"] = True
 
+    def is_failed(self, save_name):
+        with self._lock:
+            file_stats = self._stats.get(save_name)
+        return file_stats is not None and file_stats["failed"]
+
     def summary(self):
         # Need to use list to ensure we get a copy, since other threads may
         # modify this while we iterate
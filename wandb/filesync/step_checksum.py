@@ -1,9 +1,14 @@
 """Batching file prepare requests to our API."""
 
+import base64
 import collections
+import hashlib
+import logging
+import multiprocessing
 import os
-import shutil
 import threading
+import time
+from six.moves import queue
 import wandb.util
 
 from wandb.filesync import step_upload
@@ -29,50 +34,72 @@ RequestCommitArtifact = collections.namedtuple(
 )
 RequestFinish = collections.namedtuple("RequestFinish", ())
 
+logger = logging.getLogger(__file__)
+
 
 class StepChecksum(object):
-    def __init__(self, api, tempdir, request_queue, output_queue, stats):
+    """Snapshots and checksums files before handing them to StepUpload.
+
+    The expensive part (copying and hashing) happens on a pool of worker threads,
+    hashlib and file IO release the GIL so this scales with the number of cores.
+    The number of bytes being processed at once is bounded so a burst of large
+    checkpoints doesn't fill the temp dir.
+    """
+
+    MAX_WORKERS = 8
+    MAX_INFLIGHT_BYTES = 1024 * 1024 * 1024
+    # Files modified this recently may still change within the same mtime tick,
+    # coarse filesystems like FAT only have a 2 second resolution
+    RACY_SECONDS = 2
+    # Bytes before the end of the previous version of an append-only file that
+    # must be unchanged to keep hashing from where we left off
+    APPEND_CHECK_BYTES = 64 * 1024
+
+    def __init__(
+        self, api, tempdir, request_queue, output_queue, stats, upload_digests=None
+    ):
         self._api = api
         self._tempdir = tempdir
         self._request_queue = request_queue
         self._output_queue = output_queue
         self._stats = stats
+        # (size, mtime) of the last version of each run file we sent to upload
+        self._last_upload_stat = {}
+        # md5 of the last successfully uploaded version of each run file, this is
+        # filled in by StepUpload
+        self._upload_digests = upload_digests if upload_digests is not None else {}
+        # (size, md5 hasher, mtime, tail bytes) of the last version of append-only
+        # files we hashed, so we only need to hash what was appended since
+        self._append_hashers = {}
 
         self._thread = threading.Thread(target=self._thread_body)
         self._thread.daemon = True
 
+        self._work_queue = queue.Queue()
+        self._workers = []
+        for _ in range(min(self.MAX_WORKERS, multiprocessing.cpu_count())):
+            worker = threading.Thread(target=self._worker_body)
+            worker.daemon = True
+            self._workers.append(worker)
+        # Guards the bookkeeping of the files being processed by the workers
+        self._inflight = threading.Condition()
+        self._inflight_bytes = 0
+        self._inflight_names = set()
+
     def _thread_body(self):
         finished = False
         while True:
             req = self._request_queue.get()
             if isinstance(req, RequestUpload):
-                path = req.path
-                if req.copy:
-                    path = os.path.join(
-                        self._tempdir.name,
-                        "%s-%s" % (wandb.util.generate_id(), req.save_name),
-                    )
-                    wandb.util.mkdir_exists_ok(os.path.dirname(path))
-                    shutil.copy2(req.path, path)
-                checksum = None
-                if req.use_prepare_flow:
-                    # passing a checksum through indicates that we'd like to use the
-                    # "prepare" file upload flow, in which we prepare the files in
-                    # the database before uploading them. This is currently only
-                    # used for artifact manifests
-                    checksum = wandb.util.md5_file(path)
-                self._stats.init_file(req.save_name, os.path.getsize(path))
-                self._output_queue.put(
-                    step_upload.RequestUpload(
-                        path,
-                        req.save_name,
-                        req.artifact_id,
-                        checksum,
-                        req.copy,
-                        req.save_fn,
-                        req.digest,
-                    )
-                )
+                if self._unchanged_since_upload(req):
+                    logger.info("Skipped unchanged file %s", req.save_name)
+                    continue
+                try:
+                    size = os.path.getsize(req.path)
+                except OSError:
+                    size = 0
+                self._acquire(req.save_name, size)
+                self._work_queue.put((req, size))
             elif isinstance(req, RequestStoreManifestFiles):
                 for entry in req.manifest.entries.values():
                     if entry.local_path:
@@ -97,6 +124,9 @@ class StepChecksum(object):
                             )
                         )
             elif isinstance(req, RequestCommitArtifact):
+                # All the uploads queued before the commit must reach StepUpload
+                # before the commit does.
+                self._wait_idle()
                 self._output_queue.put(
                     step_upload.RequestCommitArtifact(
                         req.artifact_id, req.finalize, req.before_commit, req.on_commit
@@ -107,9 +137,145 @@ class StepChecksum(object):
             else:
                 raise Exception("internal error")
 
+        self._wait_idle()
+        for _ in self._workers:
+            self._work_queue.put(None)
         self._output_queue.put(step_upload.RequestFinish())
 
+    def _worker_body(self):
+        while True:
+            work = self._work_queue.get()
+            if work is None:
+                break
+            req, size = work
+            try:
+                self._checksum(req)
+            except Exception:
+                logger.exception("Failed to prepare file for upload: %s", req.path)
+            finally:
+                self._release(req.save_name, size)
+
+    def _checksum(self, req):
+        path = req.path
+        if req.copy:
+            path = os.path.join(
+                self._tempdir.name, "%s-%s" % (wandb.util.generate_id(), req.save_name),
+            )
+            wandb.util.mkdir_exists_ok(os.path.dirname(path))
+            wandb.util.snapshot_file(req.path, path)
+        digest = req.digest
+        if req.artifact_id is None and req.save_fn is None:
+            digest = self._file_digest(req.save_name, path)
+            if self._upload_digests.get(req.save_name) == digest:
+                logger.info("Skipped uploading %s, content unchanged", req.save_name)
+                if req.copy:
+                    os.remove(path)
+                return
+        checksum = None
+        if req.use_prepare_flow:
+            # passing a checksum through indicates that we'd like to use the
+            # "prepare" file upload flow, in which we prepare the files in
+            # the database before uploading them. This is currently only
+            # used for artifact manifests
+            checksum = digest or wandb.util.md5_file(path)
+        self._stats.init_file(req.save_name, os.path.getsize(path))
+        self._output_queue.put(
+            step_upload.RequestUpload(
+                path,
+                req.save_name,
+                req.artifact_id,
+                checksum,
+                req.copy,
+                req.save_fn,
+                digest,
+            )
+        )
+
+    def _file_digest(self, save_name, path):
+        """Returns the b64 md5 of a run file.
+
+        Files we expect to only be appended to (tfevents, logs) keep the hasher
+        state of the previous version around, so growing them only costs hashing
+        the new tail. The end of the previous version is compared first, and the
+        whole file is hashed again if it was rewritten.
+        """
+        append_only = "tfevents" in save_name or save_name.endswith(".log")
+        offset = 0
+        hasher = hashlib.md5()
+        mtime = getattr(os.stat(path), "st_mtime_ns", os.path.getmtime(path))
+        with open(path, "rb") as f:
+            prev = self._append_hashers.get(save_name) if append_only else None
+            if prev is not None and self._is_appended(f, mtime, *prev):
+                offset = prev[0]
+                hasher = prev[1].copy()
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+                offset += len(chunk)
+            if append_only:
+                f.seek(max(offset - self.APPEND_CHECK_BYTES, 0))
+                tail = f.read(offset - f.tell())
+                self._append_hashers[save_name] = (offset, hasher.copy(), mtime, tail)
+        return base64.b64encode(hasher.digest()).decode("ascii")
+
+    def _is_appended(self, f, mtime, prev_size, prev_hasher, prev_mtime, prev_tail):
+        """Whether the file still starts with the previous version we hashed"""
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < prev_size or (size == prev_size and mtime != prev_mtime):
+            return False
+        f.seek(prev_size - len(prev_tail))
+        return f.read(len(prev_tail)) == prev_tail
+
+    def _acquire(self, save_name, size):
+        """Blocks until a worker can take this file.
+
+        Versions of the same file are processed one at a time so they reach
+        StepUpload in the order they were requested.
+        """
+        with self._inflight:
+            while save_name in self._inflight_names or (
+                self._inflight_bytes > 0
+                and self._inflight_bytes + size > self.MAX_INFLIGHT_BYTES
+            ):
+                self._inflight.wait()
+            self._inflight_names.add(save_name)
+            self._inflight_bytes += size
+
+    def _release(self, save_name, size):
+        with self._inflight:
+            self._inflight_names.discard(save_name)
+            self._inflight_bytes -= size
+            self._inflight.notify_all()
+
+    def _wait_idle(self):
+        with self._inflight:
+            while self._inflight_names:
+                self._inflight.wait()
+
+    def _unchanged_since_upload(self, req):
+        """Returns True if this file was already sent to upload in its current state"""
+        if req.artifact_id is not None or req.save_fn is not None:
+            return False
+        try:
+            stat = os.stat(req.path)
+        except OSError:
+            return False
+        file_stat = (stat.st_size, getattr(stat, "st_mtime_ns", stat.st_mtime))
+        if self._last_upload_stat.get(
+            req.save_name
+        ) == file_stat and not self._stats.is_failed(req.save_name):
+            return True
+        if time.time() - stat.st_mtime > self.RACY_SECONDS:
+            self._last_upload_stat[req.save_name] = file_stat
+        else:
+            # A rewrite could keep this stat, so the digest has to decide
+            self._last_upload_stat.pop(req.save_name, None)
+        return False
+
     def start(self):
+        for worker in self._workers:
+            worker.start()
         self._thread.start()
 
     def is_alive(self):
@@ -1,9 +1,12 @@
 """Batching file prepare requests to our API."""
 
 import collections
+import heapq
+import itertools
 import threading
 from six.moves import queue
 
+from wandb.filesync import bandwidth
 from wandb.filesync import upload_job
 from wandb.errors.term import termerror
 
@@ -19,18 +22,33 @@ RequestFinish = collections.namedtuple("RequestFinish", ())
 
 
 class StepUpload(object):
-    def __init__(self, api, stats, event_queue, max_jobs, silent=False):
+    def __init__(
+        self,
+        api,
+        stats,
+        event_queue,
+        max_jobs,
+        silent=False,
+        upload_digests=None,
+        bandwidth_limiter=None,
+    ):
         self._api = api
         self._stats = stats
         self._event_queue = event_queue
         self._max_jobs = max_jobs
+        self._bandwidth_limiter = bandwidth_limiter
+        # md5 of the last successfully uploaded version of each run file
+        self._upload_digests = upload_digests if upload_digests is not None else {}
 
         self._thread = threading.Thread(target=self._thread_body)
         self._thread.daemon = True
 
         # Indexed by files' `save_name`'s, which are their ID's in the Run.
         self._running_jobs = {}
+        # Heap of (priority, sequence, event) so metadata and media files waiting
+        # for a free job slot go before artifacts and checkpoints
         self._pending_jobs = []
+        self._pending_sequence = itertools.count()
 
         self._artifacts = {}
 
@@ -76,10 +94,12 @@ class StepUpload(object):
                     termerror(
                         "Uploading artifact file failed. Artifact won't be committed."
                     )
+            elif event.success and job.digest:
+                self._upload_digests[job.save_name] = job.digest
             self._running_jobs.pop(job.save_name)
             # If we have any pending jobs, start one now
             if self._pending_jobs:
-                event = self._pending_jobs.pop(0)
+                _, _, event = heapq.heappop(self._pending_jobs)
                 self._start_upload_job(event)
         elif isinstance(event, RequestCommitArtifact):
             if event.artifact_id not in self._artifacts:
@@ -101,7 +121,7 @@ class StepUpload(object):
                     self._init_artifact(event.artifact_id)
                 self._artifacts[event.artifact_id]["pending_count"] += 1
             if len(self._running_jobs) == self._max_jobs:
-                self._pending_jobs.append(event)
+                self._add_pending_job(event)
             else:
                 self._start_upload_job(event)
         else:
@@ -115,7 +135,7 @@ class StepUpload(object):
         # we're already uploading this file, put the event on the
         # end of the queue
         if event.save_name in self._running_jobs:
-            self._pending_jobs.append(event)
+            self._add_pending_job(event)
             return
 
         # Start it.
@@ -131,10 +151,18 @@ class StepUpload(object):
             event.copied,
             event.save_fn,
             event.digest,
+            priority=bandwidth.upload_priority(event.save_name, event.artifact_id),
+            bandwidth_limiter=self._bandwidth_limiter,
         )
         self._running_jobs[event.save_name] = job
         job.start()
 
+    def _add_pending_job(self, event):
+        priority = bandwidth.upload_priority(event.save_name, event.artifact_id)
+        heapq.heappush(
+            self._pending_jobs, (priority, next(self._pending_sequence), event)
+        )
+
     def _init_artifact(self, artifact_id):
         self._artifacts[artifact_id] = {
             "pending_count": 0,
@@ -4,6 +4,7 @@ import logging
 import threading
 
 import wandb
+from wandb.filesync import bandwidth
 
 EventJobDone = collections.namedtuple("EventJobDone", ("job", "success"))
 logger = logging.getLogger(__file__)
@@ -23,6 +24,8 @@ class UploadJob(threading.Thread):
         copied,
         save_fn,
         digest,
+        priority=bandwidth.PRIORITY_OTHER,
+        bandwidth_limiter=None,
     ):
         """A file upload thread.
 
@@ -34,6 +37,9 @@ class UploadJob(threading.Thread):
             save_name: string logical location of the file relative to the run
                 directory.
             path: actual string path of the file to upload on the filesystem.
+            priority: upload priority class, see wandb.filesync.bandwidth.
+            bandwidth_limiter: optional TokenBucket every uploaded byte is
+                taken from.
         """
         self._done_queue = done_queue
         self._stats = stats
@@ -46,6 +52,8 @@ class UploadJob(threading.Thread):
         self.copied = copied
         self.save_fn = save_fn
         self.digest = digest
+        self.priority = priority
+        self._bandwidth_limiter = bandwidth_limiter
         super(UploadJob, self).__init__()
 
     def run(self):
@@ -66,9 +74,7 @@ class UploadJob(threading.Thread):
         if self.save_fn:
             # Retry logic must happen in save_fn currently
             try:
-                deduped = self.save_fn(
-                    lambda _, t: self._stats.update_uploaded_file(self.save_path, t)
-                )
+                deduped = self.save_fn(self._progress_callback(self.save_path))
             except Exception as e:
                 self._stats.update_failed_file(self.save_path)
                 logger.exception("Failed to upload file: %s", self.save_path)
@@ -127,7 +133,7 @@ class UploadJob(threading.Thread):
                     self._api.upload_file_retry(
                         upload_url,
                         f,
-                        lambda _, t: self.progress(t),
+                        self._progress_callback(self.save_name),
                         extra_headers=extra_headers,
                     )
                 logger.info("Uploaded file %s", self.save_path)
@@ -144,5 +150,12 @@ class UploadJob(threading.Thread):
                 return False
         return True
 
-    def progress(self, total_bytes):
-        self._stats.update_uploaded_file(self.save_name, total_bytes)
+    def _progress_callback(self, stats_name):
+        def progress(bites, total_bytes):
+            # Blocking here throttles the upload, the next chunk of the file
+            # is only read once we return
+            if self._bandwidth_limiter is not None:
+                self._bandwidth_limiter.consume(bites, self.priority)
+            self._stats.update_uploaded_file(stats_name, total_bytes)
+
+        return progress
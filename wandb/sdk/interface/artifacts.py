@@ -1,13 +1,37 @@
 #
 import base64
 import binascii
+import bisect
 import codecs
+import contextlib
 import hashlib
+import json
+import logging
 import os
-
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+try:
+    import sqlite3
+except ImportError:  # python builds without sqlite
+    sqlite3 = None
+
+import six
 from wandb import env
 from wandb import util
 
+logger = logging.getLogger(__name__)
+
 
 def md5_string(string):
     hash_md5 = hashlib.md5()
@@ -27,8 +51,21 @@ def md5_hash_file(path):
     return hash_md5
 
 
-def md5_file_b64(path):
-    return base64.b64encode(md5_hash_file(path).digest()).decode("ascii")
+def md5_file_b64(path, use_cache=True):
+    """Returns the base64 md5 of a file.
+
+    Digests are remembered in the persistent hash cache, so hashing a file that
+    hasn't changed since it was last hashed only costs a stat.
+    """
+    cache = get_hash_cache() if use_cache else None
+    if cache is None:
+        return base64.b64encode(md5_hash_file(path).digest()).decode("ascii")
+    stat = os.stat(path)
+    digest = cache.get(path, stat)
+    if digest is None:
+        digest = base64.b64encode(md5_hash_file(path).digest()).decode("ascii")
+        cache.set(path, stat, digest)
+    return digest
 
 
 def md5_file_hex(path):
@@ -51,6 +88,11 @@ class ArtifactManifest(object):
             if sub.version() == version:
                 return sub.from_manifest_json(artifact, manifest_json)
 
+    @classmethod
+    def from_manifest_text(cls, artifact, text):
+        """Like from_manifest_json, for the raw text of a manifest file."""
+        return cls.from_manifest_json(artifact, read_manifest_json(text))
+
     @classmethod
     def version(cls):
         pass
@@ -59,6 +101,8 @@ class ArtifactManifest(object):
         self.artifact = artifact
         self.storage_policy = storage_policy
         self.entries = entries or {}
+        # Sorted entry paths for prefix queries, rebuilt lazily after changes
+        self._sorted_paths = None
 
     def to_manifest_json(self):
         raise NotImplementedError()
@@ -72,19 +116,172 @@ class ArtifactManifest(object):
             and entry.digest != self.entries[entry.path].digest
         ):
             raise ValueError("Cannot add the same path twice: %s" % entry.path)
+        if entry.path not in self.entries:
+            self._sorted_paths = None
         self.entries[entry.path] = entry
 
+    def remove_entry(self, path):
+        del self.entries[path]
+        self._sorted_paths = None
+
     def get_entry_by_path(self, path):
         return self.entries.get(path)
 
+    def diff(self, base):
+        """Returns the sorted paths added, removed and changed relative to `base`."""
+        added, changed = [], []
+        for path, entry in six.iteritems(self.entries):
+            base_entry = base.entries.get(path)
+            if base_entry is None:
+                added.append(path)
+            elif (entry.digest, entry.ref) != (base_entry.digest, base_entry.ref):
+                changed.append(path)
+        removed = [path for path in base.entries if path not in self.entries]
+        return sorted(added), sorted(removed), sorted(changed)
+
+    def get_entries_with_prefix(self, prefix):
+        """Returns the entries whose path starts with `prefix`, sorted by path."""
+        paths = self._sorted_paths
+        if paths is None or len(paths) != len(self.entries):
+            paths = self._sorted_paths = sorted(self.entries)
+        entries = []
+        for i in range(bisect.bisect_left(paths, prefix), len(paths)):
+            if not paths[i].startswith(prefix):
+                break
+            entries.append(self.entries[paths[i]])
+        return entries
+
     def get_entries_in_directory(self, directory):
-        return [
-            self.entries[entry_key]
-            for entry_key in self.entries
-            if entry_key.startswith(
-                directory + "/"
-            )  # entries use forward slash even for windows
-        ]
+        # entries use forward slash even for windows
+        return self.get_entries_with_prefix(directory + "/")
+
+
+class ArtifactManifestEntry(object):
+    """A file in an artifact manifest.
+
+    Manifests can have millions of entries, so entries use slots and only hold
+    an `extra` dict when there is something in it.
+    """
+
+    __slots__ = (
+        "path",
+        "ref",
+        "digest",
+        "birth_artifact_id",
+        "size",
+        "_extra",
+        "local_path",
+    )
+
+    def __init__(
+        self,
+        path,
+        ref,
+        digest,
+        birth_artifact_id=None,
+        size=None,
+        extra=None,
+        local_path=None,
+    ):
+        if local_path is not None and size is None:
+            raise AssertionError(
+                "programming error, size required when local_path specified"
+            )
+        self.path = util.to_forward_slash_path(path)
+        self.ref = ref  # This is None for files stored in the artifact.
+        self.digest = digest
+        self.birth_artifact_id = birth_artifact_id
+        self.size = size
+        self._extra = extra or None
+        # This is not stored in the manifest json, it's only used in the process
+        # of saving
+        self.local_path = local_path
+
+    @property
+    def extra(self):
+        if self._extra is None:
+            return {}
+        return self._extra
+
+    @classmethod
+    def from_json(cls, path, val):
+        return cls(
+            path=path,
+            digest=val["digest"],
+            birth_artifact_id=val.get("birthArtifactID"),
+            ref=val.get("ref"),
+            size=val.get("size"),
+            extra=val.get("extra"),
+            local_path=val.get("local_path"),
+        )
+
+    def to_json(self):
+        json_entry = {
+            "digest": self.digest,
+        }
+        if self.birth_artifact_id:
+            json_entry["birthArtifactID"] = self.birth_artifact_id
+        if self.ref:
+            json_entry["ref"] = self.ref
+        if self._extra:
+            json_entry["extra"] = self._extra
+        if self.size is not None:
+            json_entry["size"] = self.size
+        return json_entry
+
+    def __repr__(self):
+        if self.ref is not None:
+            summary = "ref: %s/%s" % (self.ref, self.path)
+        else:
+            summary = "digest: %s" % self.digest
+
+        return "<ManifestEntry %s>" % summary
+
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _json_skip(text, idx, char=None):
+    """Skips whitespace and, if given, the expected `char` after it."""
+    idx = _JSON_WHITESPACE.match(text, idx).end()
+    if char is not None:
+        if text[idx : idx + 1] != char:
+            raise ValueError("Expected %r at position %i of manifest" % (char, idx))
+        idx = _JSON_WHITESPACE.match(text, idx + 1).end()
+    return idx
+
+
+def read_manifest_json(text):
+    """Parses manifest JSON, turning "contents" into entries one at a time.
+
+    json.loads would hold a dict per entry for the whole manifest before we
+    convert any of them.
+    """
+    manifest_json = {}
+    idx = _json_skip(text, 0, "{")
+    while text[idx : idx + 1] != "}":
+        key, idx = _JSON_DECODER.raw_decode(text, idx)
+        idx = _json_skip(text, idx, ":")
+        if key == "contents":
+            value = {}
+            idx = _json_skip(text, idx, "{")
+            while text[idx : idx + 1] != "}":
+                path, idx = _JSON_DECODER.raw_decode(text, idx)
+                idx = _json_skip(text, idx, ":")
+                val, idx = _JSON_DECODER.raw_decode(text, idx)
+                value[path] = ArtifactManifestEntry.from_json(path, val)
+                idx = _json_skip(text, idx)
+                if text[idx : idx + 1] == ",":
+                    idx = _json_skip(text, idx, ",")
+            idx = _json_skip(text, idx, "}")
+        else:
+            value, idx = _JSON_DECODER.raw_decode(text, idx)
+        manifest_json[key] = value
+        idx = _json_skip(text, idx)
+        if text[idx : idx + 1] == ",":
+            idx = _json_skip(text, idx, ",")
+    return manifest_json
 
 
 class StorageLayout(object):
@@ -163,28 +360,233 @@ class StorageHandler(object):
 
 
 class ArtifactsCache(object):
-    def __init__(self, cache_dir):
+    """Content addressed storage of artifact files.
+
+    With a `max_size` the least recently used objects are evicted once the
+    cache grows past it. A cache hit sets the object's atime explicitly, so
+    recency doesn't depend on how the filesystem is mounted, and leaves the
+    mtime alone since downloads compare it to decide whether to copy.
+
+    Objects that are still needed, like files staged for an upload or the
+    target of a symlinked download, are pinned and never evicted.
+    """
+
+    # Objects used this recently are never evicted, another process may be
+    # about to copy them out of the cache.
+    EVICTION_GRACE_SECONDS = 60
+    # Temp files of downloads that crashed, and pins of uploads that never
+    # finished, are removed after this long
+    STALE_TMP_SECONDS = 24 * 60 * 60
+    # Hex digits of the object key naming its lock file, objects sharing a
+    # lock wait for each other's writes
+    LOCK_KEY_CHARS = 3
+
+    def __init__(self, cache_dir, max_size=None):
         self._cache_dir = cache_dir
         util.mkdir_exists_ok(self._cache_dir)
         self._md5_obj_dir = os.path.join(self._cache_dir, "obj", "md5")
         self._etag_obj_dir = os.path.join(self._cache_dir, "obj", "etag")
+        self._tmp_dir = os.path.join(self._cache_dir, "tmp")
+        self._lock_dir = os.path.join(self._cache_dir, "locks")
+        self._pin_dir = os.path.join(self._cache_dir, "pins")
         self._artifacts_by_id = {}
+        self._max_size = max_size
+        # Estimated size of the objects, scanned on the first write
+        self._size = None
+        self._size_lock = threading.Lock()
 
     def check_md5_obj_path(self, b64_md5, size):
         hex_md5 = util.bytes_to_hex(base64.b64decode(b64_md5))
         path = os.path.join(self._cache_dir, "obj", "md5", hex_md5[:2], hex_md5[2:])
-        if os.path.isfile(path) and os.path.getsize(path) == size:
-            return path, True
-        util.mkdir_exists_ok(os.path.dirname(path))
-        return path, False
+        return self._check_obj_path(path, size)
 
     def check_etag_obj_path(self, etag, size):
         path = os.path.join(self._cache_dir, "obj", "etag", etag[:2], etag[2:])
-        if os.path.isfile(path) and os.path.getsize(path) == size:
+        return self._check_obj_path(path, size)
+
+    def _check_obj_path(self, path, size):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if stat is not None and stat.st_size == size:
+            self._touch(path, stat)
             return path, True
         util.mkdir_exists_ok(os.path.dirname(path))
+        self._reserve(size or 0)
         return path, False
 
+    @contextlib.contextmanager
+    def write_obj(self, path, size, resumable=False):
+        """Context manager for filling the object at `path`, from check_*_obj_path.
+
+        Yields a temp path to write the object to, which is renamed into place on
+        success so readers never see a partial object. Writers of the same
+        object, in any process, wait for each other, and get None instead of a
+        temp path if the object was written while they waited. Objects share a
+        fixed set of lock files, by key prefix, which are never removed:
+        removing one while it's locked would let a later writer lock a new file
+        while a waiter still holds the old one.
+
+        With `resumable` the temp path is the same for every attempt at the
+        object and is kept when the write fails, so the next attempt can pick
+        up what was already written.
+        """
+        util.mkdir_exists_ok(self._lock_dir)
+        util.mkdir_exists_ok(self._tmp_dir)
+        obj_key = _obj_key(path)
+        lock_path = os.path.join(self._lock_dir, obj_key[: self.LOCK_KEY_CHARS])
+        with open(lock_path, "a") as lock_file:
+            _lock_file(lock_file)
+            try:
+                hit = os.path.isfile(path) and os.path.getsize(path) == size
+                if hit:
+                    yield None
+                else:
+                    if resumable:
+                        tmp_path = os.path.join(self._tmp_dir, obj_key)
+                    else:
+                        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+                        os.close(fd)
+                    try:
+                        yield tmp_path
+                        _replace_file(tmp_path, path)
+                    finally:
+                        if not resumable and os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+            finally:
+                _unlock_file(lock_file)
+
+    def pin(self, path, name, link=None):
+        """Keeps the object at `path` from being evicted until unpin(path, name).
+
+        A pin for a symlink to the object, given as `link`, lasts as long as the
+        link does. Other pins expire after STALE_TMP_SECONDS, in case the
+        process that made them died. Without a max size nothing is evicted on
+        its own, so nothing is pinned.
+        """
+        if self._max_size is None:
+            return
+        pin_path = self._pin_path(path, name)
+        for attempt in range(2):
+            util.mkdir_exists_ok(os.path.dirname(pin_path))
+            try:
+                with open(pin_path, "w") as f:
+                    f.write(link or "")
+                return
+            except IOError:
+                # unpin removed the emptied dir in between
+                if attempt:
+                    raise
+
+    def unpin(self, path, name):
+        if self._max_size is None:
+            return
+        pin_path = self._pin_path(path, name)
+        try:
+            os.remove(pin_path)
+            os.rmdir(os.path.dirname(pin_path))
+        except OSError:
+            # already removed, or the object has other pins
+            pass
+
+    def _pin_path(self, path, name):
+        return os.path.join(self._pin_dir, _obj_key(path), _obj_key(name))
+
+    def _is_pinned(self, path):
+        pin_dir = os.path.join(self._pin_dir, _obj_key(path))
+        if not os.path.isdir(pin_dir):
+            return False
+        stale_cutoff = time.time() - self.STALE_TMP_SECONDS
+        pinned = False
+        for pin_path, stat in util.scan_files(pin_dir):
+            try:
+                with open(pin_path) as f:
+                    link = f.read()
+            except IOError:
+                continue
+            if link:
+                live = os.path.islink(link) and os.path.realpath(
+                    link
+                ) == os.path.realpath(path)
+            else:
+                live = stat.st_mtime > stale_cutoff
+            if live:
+                pinned = True
+            else:
+                try:
+                    os.remove(pin_path)
+                except OSError:
+                    pass
+        if not pinned:
+            try:
+                os.rmdir(pin_dir)
+            except OSError:
+                pass
+        return pinned
+
+    @staticmethod
+    def _touch(path, stat):
+        try:
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+
+    def _reserve(self, size):
+        if self._max_size is None:
+            return
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(stat.st_size for _, stat in self._objects())
+            self._size += size
+            if self._size <= self._max_size:
+                return
+        # Evict down to 80% so we don't scan the cache on every download, leaving
+        # room for the object about to be written
+        self.cleanup(max(int(self._max_size * 0.8) - size, 0))
+        with self._size_lock:
+            self._size += size
+
+    def _objects(self):
+        for obj_dir in (self._md5_obj_dir, self._etag_obj_dir):
+            if os.path.isdir(obj_dir):
+                for path, stat in util.scan_files(obj_dir):
+                    yield path, stat
+
+    def cleanup(self, target_size):
+        """Evicts the least recently used objects until the cache fits in
+        `target_size` bytes. Returns the number of bytes reclaimed.
+        """
+        objects = sorted(self._objects(), key=lambda obj: obj[1].st_atime)
+        total = sum(stat.st_size for _, stat in objects)
+        reclaimed = 0
+        grace_cutoff = time.time() - self.EVICTION_GRACE_SECONDS
+        for path, stat in objects:
+            if total - reclaimed <= target_size:
+                break
+            if stat.st_atime > grace_cutoff:
+                break
+            try:
+                # Skip objects another process touched since we scanned
+                if os.stat(path).st_atime != stat.st_atime or self._is_pinned(path):
+                    continue
+                _remove_obj(path)
+            except OSError:
+                # Already evicted, or open elsewhere on Windows
+                continue
+            reclaimed += stat.st_size
+        with self._size_lock:
+            self._size = total - reclaimed
+        if os.path.isdir(self._tmp_dir):
+            stale_cutoff = time.time() - self.STALE_TMP_SECONDS
+            for path, stat in util.scan_files(self._tmp_dir):
+                if stat.st_mtime < stale_cutoff:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return reclaimed
+
     def get_artifact(self, artifact_id):
         return self._artifacts_by_id.get(artifact_id)
 
@@ -192,6 +594,157 @@ class ArtifactsCache(object):
         self._artifacts_by_id[artifact.id] = artifact
 
 
+def _obj_key(path):
+    return hashlib.md5(path.encode("utf-8")).hexdigest()
+
+
+def _remove_obj(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Hardlinked objects are read-only, which Windows won't remove
+        if not os.path.exists(path):
+            raise
+        os.chmod(path, 0o644)
+        os.remove(path)
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        f.seek(0)
+        while True:
+            try:
+                # gives up after 10 seconds
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except IOError:
+                pass
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _replace_file(src, dst):
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+    else:  # python 2, rename already replaces dst on posix
+        os.rename(src, dst)
+
+
+class HashCache(object):
+    """Persistent md5 digests of local files, stored in SQLite.
+
+    Entries are keyed by path and only used while the file's inode, size, mtime
+    and ctime still match. ctime catches rewrites that restore the mtime, and
+    can't be set from userspace. Any database or filesystem error, like a
+    read-only cache dir, turns into a cache miss.
+    """
+
+    # Files modified this recently may still change within the same mtime tick
+    RACY_SECONDS = 2
+
+    def __init__(self, db_path):
+        self._db_path = db_path
+        self._disabled = False
+        # One connection shared by every thread, queries are short
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, args):
+        """Runs a query on the shared connection and returns its first row."""
+        with self._lock:
+            # connections can't be shared with forked processes
+            if self._db is None or self._pid != os.getpid():
+                util.mkdir_exists_ok(os.path.dirname(self._db_path))
+                db = sqlite3.connect(
+                    self._db_path,
+                    timeout=30,
+                    isolation_level=None,
+                    check_same_thread=False,
+                )
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS md5 (path TEXT PRIMARY KEY, "
+                    "inode INTEGER, size INTEGER, mtime_ns INTEGER, "
+                    "ctime_ns INTEGER, digest TEXT)"
+                )
+                self._db, self._pid = db, os.getpid()
+            return self._db.execute(sql, args).fetchone()
+
+    @staticmethod
+    def _key(stat):
+        if hasattr(stat, "st_mtime_ns"):
+            return stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+        # python 2
+        return (
+            stat.st_ino,
+            stat.st_size,
+            int(stat.st_mtime * 1e9),
+            int(stat.st_ctime * 1e9),
+        )
+
+    def get(self, path, stat):
+        if self._disabled:
+            return None
+        try:
+            row = self._execute(
+                "SELECT inode, size, mtime_ns, ctime_ns, digest FROM md5 "
+                "WHERE path = ?",
+                (os.path.abspath(path),),
+            )
+        except (sqlite3.Error, OSError) as e:
+            self._disable(e)
+            return None
+        if row is None or tuple(row[:4]) != self._key(stat):
+            return None
+        return row[4]
+
+    def set(self, path, stat, digest):
+        now = time.time()
+        if (
+            self._disabled
+            or now - max(stat.st_mtime, stat.st_ctime) < self.RACY_SECONDS
+        ):
+            return
+        try:
+            self._execute(
+                "INSERT OR REPLACE INTO md5 VALUES (?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(path),) + self._key(stat) + (digest,),
+            )
+        except (sqlite3.Error, OSError) as e:
+            self._disable(e)
+
+    def close(self):
+        """Closes the connection, it is reopened on next use"""
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
+
+    def _disable(self, e):
+        logger.warning("disabling hash cache %s: %s", self._db_path, e)
+        self._disabled = True
+
+
+_hash_cache = None
+
+
+def get_hash_cache():
+    global _hash_cache
+    if _hash_cache is None and sqlite3 is not None:
+        cache_dir = os.path.join(env.get_cache_dir(), "artifacts")
+        _hash_cache = HashCache(os.path.join(cache_dir, "hashes.db"))
+    return _hash_cache
+
+
 _artifacts_cache = None
 
 
@@ -199,5 +752,8 @@ def get_artifacts_cache():
     global _artifacts_cache
     if _artifacts_cache is None:
         cache_dir = os.path.join(env.get_cache_dir(), "artifacts")
-        _artifacts_cache = ArtifactsCache(cache_dir)
+        max_size = env.get_cache_max_size()
+        _artifacts_cache = ArtifactsCache(
+            cache_dir, max_size=util.parse_size(max_size) if max_size else None
+        )
     return _artifacts_cache
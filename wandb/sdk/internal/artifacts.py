@@ -146,7 +146,7 @@ class ArtifactSaver(object):
         def before_commit():
             with tempfile.NamedTemporaryFile("w+", suffix=".json", delete=False) as fp:
                 path = os.path.abspath(fp.name)
-                json.dump(self._manifest.to_manifest_json(), fp, indent=4)
+                self._manifest.write_manifest_json(fp)
             digest = wandb.util.md5_file(path)
             if distributed_id:
                 # If we're in the distributed flow, we want to update the
@@ -1,11 +1,20 @@
 #
+import base64
 import contextlib
+from functools import partial
+import hashlib
+import itertools
+import json
+import multiprocessing
+import multiprocessing.dummy
 import re
 import os
+import threading
 import time
 import shutil
 import requests
 
+from six.moves import queue
 from six.moves.urllib.parse import urlparse, quote
 
 import wandb
@@ -33,6 +42,21 @@ _REQUEST_POOL_CONNECTIONS = 64
 
 _REQUEST_POOL_MAXSIZE = 64
 
+# How often add_dir reports progress on large directories
+ADD_DIR_PROGRESS_SECONDS = 5
+
+# Objects at least this big are downloaded in parallel HTTP Range requests
+RANGE_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024
+RANGE_DOWNLOAD_PART_SIZE = 16 * 1024 * 1024
+RANGE_DOWNLOAD_WORKERS = 8
+# Retries of a part whose connection broke mid-stream, the session already
+# retries requests that fail with a retryable status
+RANGE_DOWNLOAD_RETRIES = 5
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# Downloads running at once share the session's connection pool, each of their
+# requests takes one of these
+_download_connections = threading.BoundedSemaphore(_REQUEST_POOL_MAXSIZE)
+
 
 class Artifact(object):
     """An artifact object you can write files into, and pass to log_artifact."""
@@ -67,6 +91,10 @@ class Artifact(object):
         self._cache = get_artifacts_cache()
         self._added_objs = {}
         self._added_local_paths = {}
+        # Set by seed(), the manifest of the version this one is based on
+        self._base_manifest = None
+        self._base_birth_ids = {}
+        self._seeded_paths = set()
         # You can write into this directory when creating artifact files
         self._artifact_dir = compat_tempfile.TemporaryDirectory(
             missing_ok_on_cleanup=True
@@ -147,7 +175,21 @@ class Artifact(object):
 
         return self._add_local_file(name, local_path, digest=digest)
 
-    def add_dir(self, local_path, name=None):
+    def add_dir(self, local_path, name=None, num_workers=None, use_processes=False):
+        """Adds a local directory to the artifact.
+
+        Files are hashed and copied into the cache as the directory is walked.
+        Files that can't be read, like broken symlinks, fail the whole call once
+        the walk is done.
+
+        Args:
+            local_path (str): path to the directory
+            name (str, optional): path inside the artifact to add the directory at
+            num_workers (int, optional): number of files to hash in parallel.
+                Defaults to a few per core, since hashing is mostly IO bound.
+            use_processes (bool, optional): hash in worker processes rather than
+                threads, for fast storage where hashing is CPU bound.
+        """
         self._ensure_can_add()
         if not os.path.isdir(local_path):
             raise ValueError("Path is not a directory: %s" % local_path)
@@ -159,28 +201,63 @@ class Artifact(object):
         )
         start_time = time.time()
 
-        paths = []
-        for dirpath, _, filenames in os.walk(local_path, followlinks=True):
-            for fname in filenames:
-                physical_path = os.path.join(dirpath, fname)
+        num_workers = num_workers or min(32, multiprocessing.cpu_count() * 4)
+        # Bounds how far the directory scan runs ahead of hashing
+        pending = threading.Semaphore(num_workers * 4)
+        aborted = threading.Event()
+        errors = []
+
+        def scan():
+            for physical_path, _ in util.scan_files(
+                local_path, follow_symlinks=True, onerror=errors.append
+            ):
                 logical_path = os.path.relpath(physical_path, start=local_path)
                 if name is not None:
                     logical_path = os.path.join(name, logical_path)
-                paths.append((logical_path, physical_path))
-
-        def add_manifest_file(log_phy_path):
-            logical_path, physical_path = log_phy_path
-            self._add_local_file(logical_path, physical_path)
-
-        import multiprocessing.dummy  # this uses threads
-
-        NUM_THREADS = 8
-        pool = multiprocessing.dummy.Pool(NUM_THREADS)
-        pool.map(add_manifest_file, paths)
-        pool.close()
-        pool.join()
+                pending.acquire()
+                if aborted.is_set():
+                    return
+                yield logical_path, physical_path
+
+        # Don't start more workers than there are files for small directories
+        paths = scan()
+        first_paths = list(itertools.islice(paths, num_workers))
+        num_workers = max(1, len(first_paths))
+        paths = itertools.chain(first_paths, paths)
+
+        if use_processes:
+            pool = multiprocessing.Pool(num_workers)
+        else:
+            pool = multiprocessing.dummy.Pool(num_workers)  # this uses threads
+        num_files, num_bytes = 0, 0
+        last_report = None
+        try:
+            for entry in pool.imap_unordered(_cache_local_file, paths):
+                pending.release()
+                self._add_cached_file(*entry)
+                num_files += 1
+                num_bytes += entry[3]
+                if time.time() - (last_report or start_time) > ADD_DIR_PROGRESS_SECONDS:
+                    if last_report is None:
+                        termlog("", prefix=False)
+                    termlog(
+                        "%i files (%s) added so far"
+                        % (num_files, util.sizeof_fmt(num_bytes))
+                    )
+                    last_report = time.time()
+        finally:
+            # unblock the scan if hashing failed half way
+            aborted.set()
+            for _ in range(num_workers * 4):
+                pending.release()
+            pool.terminate()
+            pool.join()
+        if errors:
+            raise errors[0]
 
-        termlog("Done. %.1fs" % (time.time() - start_time), prefix=False)
+        termlog(
+            "Done. %.1fs" % (time.time() - start_time), prefix=last_report is not None
+        )
 
     def add_reference(self, uri, name=None, checksum=True, max_objects=None):
         """adds `uri` to the artifact via a reference, located at `name`. 
@@ -213,6 +290,7 @@ class Artifact(object):
             self, uri, name=name, checksum=checksum, max_objects=max_objects
         )
         for entry in manifest_entries:
+            self._unseed(entry.path)
             self._manifest.add_entry(entry)
 
         return manifest_entries
@@ -245,7 +323,7 @@ class Artifact(object):
         val = obj.to_json(self)
         name = obj.with_suffix(name)
         entry = self._manifest.get_entry_by_path(name)
-        if entry is not None:
+        if entry is not None and entry.path not in self._seeded_paths:
             return entry
         with self.new_file(name) as f:
             import json
@@ -261,6 +339,65 @@ class Artifact(object):
 
         return entry
 
+    def seed(self, base):
+        """Starts this artifact from the contents of a previous version.
+
+        Entries of `base` are carried over as is and can be replaced with `add_*`
+        calls or dropped with `remove`. Files whose content is already stored in
+        `base` aren't uploaded again when this version is logged.
+
+        Arguments:
+            base (wandb.apis.public.Artifact): a logged version to build on
+        """
+        self._ensure_can_add()
+        self._base_manifest = base.manifest
+        for entry in self._base_manifest.entries.values():
+            birth_artifact_id = entry.birth_artifact_id
+            if entry.ref is None and birth_artifact_id is None:
+                birth_artifact_id = base.id
+            if entry.ref is None:
+                self._base_birth_ids[entry.digest] = birth_artifact_id
+            if self._manifest.get_entry_by_path(entry.path) is None:
+                self._manifest.add_entry(
+                    ArtifactManifestEntry(
+                        entry.path,
+                        entry.ref,
+                        entry.digest,
+                        birth_artifact_id=birth_artifact_id,
+                        size=entry.size,
+                        extra=entry.extra,
+                    )
+                )
+                self._seeded_paths.add(entry.path)
+
+    def remove(self, name):
+        """Removes the file or directory at `name` from the artifact."""
+        self._ensure_can_add()
+        name = util.to_forward_slash_path(name).rstrip("/")
+        entries = self._manifest.get_entries_in_directory(name)
+        entry = self._manifest.get_entry_by_path(name)
+        if entry is not None:
+            entries.append(entry)
+        if not entries:
+            raise ValueError("Path not contained in artifact: %s" % name)
+        for entry in entries:
+            self._manifest.remove_entry(entry.path)
+            self._seeded_paths.discard(entry.path)
+            if entry.local_path is not None:
+                self._cache.unpin(entry.local_path, entry.path)
+
+    def diff(self):
+        """Returns the paths added, removed and changed since the seeded version."""
+        if self._base_manifest is None:
+            raise ValueError("Artifact wasn't seeded from a previous version")
+        return self._manifest.diff(self._base_manifest)
+
+    def _unseed(self, path):
+        # Content carried over from the base version may be replaced
+        if path in self._seeded_paths:
+            self._seeded_paths.discard(path)
+            self._manifest.remove_entry(path)
+
     def get_added_local_path_name(self, local_path):
         """If local_path was already added to artifact, return its internal name."""
         entry = self._added_local_paths.get(local_path, None)
@@ -286,22 +423,180 @@ class Artifact(object):
         self._digest = self._manifest.digest()
 
     def _add_local_file(self, name, path, digest=None):
-        digest = digest or md5_file_b64(path)
-        size = os.path.getsize(path)
-
-        cache_path, hit = self._cache.check_md5_obj_path(digest, size)
-        if not hit:
-            shutil.copyfile(path, cache_path)
+        _, _, digest, size, cache_path = _cache_local_file((name, path), digest)
+        return self._add_cached_file(name, path, digest, size, cache_path)
 
+    def _add_cached_file(self, name, path, digest, size, cache_path):
         entry = ArtifactManifestEntry(
             name, None, digest=digest, size=size, local_path=cache_path,
         )
+        # Content the base version already stored doesn't need another upload
+        if self._base_birth_ids.get(digest) is not None:
+            entry.birth_artifact_id = self._base_birth_ids[digest]
+            entry.local_path = None
 
+        self._unseed(entry.path)
         self._manifest.add_entry(entry)
         self._added_local_paths[path] = entry
+        if entry.local_path is not None:
+            # Until it's uploaded by store_file
+            self._cache.pin(entry.local_path, entry.path)
         return entry
 
 
+def _cache_local_file(log_phy_path, digest=None):
+    """Hashes a local file and copies it into the artifacts cache.
+
+    This is a module level function so add_dir can run it in worker processes.
+    """
+    logical_path, physical_path = log_phy_path
+    digest = digest or md5_file_b64(physical_path)
+    size = os.path.getsize(physical_path)
+
+    cache = get_artifacts_cache()
+    cache_path, hit = cache.check_md5_obj_path(digest, size)
+    if not hit:
+        with cache.write_obj(cache_path, size) as tmp_path:
+            if tmp_path is not None:
+                shutil.copyfile(physical_path, tmp_path)
+    return logical_path, physical_path, digest, size, cache_path
+
+
+def _download_url(session, url, path, size, auth=None, response=None, digest=None):
+    """Downloads url to path, in parallel Range requests if the object is big.
+
+    The parts written so far are recorded next to path with the ETag of the
+    object, so calling this again with the same path after a failure resumes the
+    download, unless the object changed in between. An already open `response`
+    for url is read from for small objects and closed otherwise. With a
+    `digest`, the b64 md5 of small objects is checked as they're read; ranged
+    downloads rely on the ETag and size checks of their parts instead of
+    reading the whole object again.
+    """
+    try:
+        if not size or size < RANGE_DOWNLOAD_THRESHOLD:
+            md5 = _download_whole(session, url, path, auth, response)
+            if digest is not None and md5 != digest:
+                raise ValueError("Digest mismatch for %s, expected %s" % (url, digest))
+        else:
+            if response is not None:
+                response.close()
+            _download_ranges(session, url, path, size, auth)
+    except ValueError:
+        # There is nothing worth resuming in a download that doesn't match
+        for stale_path in (path, path + ".parts"):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        raise
+
+
+def _download_whole(session, url, path, auth, response):
+    """Returns the b64 md5 of the object, hashed while it's written."""
+    hash_md5 = hashlib.md5()
+    with _download_connections:
+        if response is None:
+            response = session.get(url, auth=auth, stream=True)
+            response.raise_for_status()
+        with open(path, "wb") as file:
+            for data in response.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE):
+                hash_md5.update(data)
+                file.write(data)
+    return base64.b64encode(hash_md5.digest()).decode("ascii")
+
+
+def _download_ranges(session, url, path, size, auth):
+    parts_path = path + ".parts"
+    state = {"etag": None, "parts": []}
+    if os.path.isfile(path) and os.path.getsize(path) == size:
+        try:
+            with open(parts_path) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+    if not state["parts"]:
+        with open(path, "wb") as file:
+            file.truncate(size)
+    done = set(state["parts"])
+    done_lock = threading.Lock()
+
+    def fetch_part(part):
+        """Returns True if the server ignored the range and sent the whole object."""
+        if _fetch_part(session, url, path, size, auth, part, state):
+            return True
+        with done_lock:
+            done.add(part)
+            with open(parts_path, "w") as f:
+                json.dump({"etag": state["etag"], "parts": sorted(done)}, f)
+        return False
+
+    num_parts = (size + RANGE_DOWNLOAD_PART_SIZE - 1) // RANGE_DOWNLOAD_PART_SIZE
+    pending = [part for part in range(num_parts) if part not in done]
+    # The first part tells us whether the server supports ranges at all, and
+    # which version of the object we're downloading
+    if pending and fetch_part(pending.pop(0)):
+        pending = []
+    if pending:
+        pool = multiprocessing.dummy.Pool(min(RANGE_DOWNLOAD_WORKERS, len(pending)))
+        try:
+            pool.map(fetch_part, pending)
+        finally:
+            pool.close()
+            pool.join()
+    if os.path.exists(parts_path):
+        os.remove(parts_path)
+
+
+def _fetch_part(session, url, path, size, auth, part, state):
+    """Writes a part of the object, retrying from where a broken connection stopped.
+
+    Returns True if the server ignored the range and sent the whole object.
+    """
+    start = part * RANGE_DOWNLOAD_PART_SIZE
+    end = min(start + RANGE_DOWNLOAD_PART_SIZE, size)
+    offset = start
+    for attempt in range(RANGE_DOWNLOAD_RETRIES + 1):
+        try:
+            with _download_connections:
+                response = session.get(
+                    url,
+                    auth=auth,
+                    stream=True,
+                    headers={"Range": "bytes=%i-%i" % (offset, end - 1)},
+                )
+                response.raise_for_status()
+                _check_same_object(url, response, size, state)
+                with open(path, "r+b") as file:
+                    if response.status_code != 206:
+                        for data in response.iter_content(DOWNLOAD_BUFFER_SIZE):
+                            file.write(data)
+                        return True
+                    file.seek(offset)
+                    for data in response.iter_content(DOWNLOAD_BUFFER_SIZE):
+                        file.write(data[: end - offset])
+                        offset += len(data)
+                        if offset >= end:
+                            break
+            if offset < end:
+                raise IOError("Connection closed after %i bytes" % offset)
+            return False
+        except (IOError, requests.RequestException):
+            if attempt == RANGE_DOWNLOAD_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _check_same_object(url, response, size, state):
+    """Raises ValueError if a part comes from a different version of the object."""
+    etag = response.headers.get("ETag")
+    content_range = response.headers.get("Content-Range")
+    if content_range and content_range.rsplit("/", 1)[-1] != str(size):
+        raise ValueError("%s changed size during the download" % url)
+    if state["etag"] is None:
+        state["etag"] = etag
+    elif etag != state["etag"]:
+        raise ValueError("%s changed during the download" % url)
+
+
 class ArtifactManifestV1(ArtifactManifest):
     @classmethod
     def version(cls):
@@ -320,16 +615,11 @@ class ArtifactManifestV1(ArtifactManifest):
         if storage_policy_cls is None:
             raise ValueError('Failed to find storage policy "%s"' % storage_policy_name)
 
+        # from_manifest_text builds the entries while parsing
         entries = {
-            name: ArtifactManifestEntry(
-                path=name,
-                digest=val["digest"],
-                birth_artifact_id=val.get("birthArtifactID"),
-                ref=val.get("ref"),
-                size=val.get("size"),
-                extra=val.get("extra"),
-                local_path=val.get("local_path"),
-            )
+            name: val
+            if isinstance(val, ArtifactManifestEntry)
+            else ArtifactManifestEntry.from_json(name, val)
             for name, val in manifest_json["contents"].items()
         }
 
@@ -352,18 +642,7 @@ class ArtifactManifestV1(ArtifactManifest):
         """
         contents = {}
         for entry in sorted(self.entries.values(), key=lambda k: k.path):
-            json_entry = {
-                "digest": entry.digest,
-            }
-            if entry.birth_artifact_id:
-                json_entry["birthArtifactID"] = entry.birth_artifact_id
-            if entry.ref:
-                json_entry["ref"] = entry.ref
-            if entry.extra:
-                json_entry["extra"] = entry.extra
-            if entry.size is not None:
-                json_entry["size"] = entry.size
-            contents[entry.path] = json_entry
+            contents[entry.path] = entry.to_json()
         return {
             "version": self.__class__.version(),
             "storagePolicy": self.storage_policy.name(),
@@ -371,6 +650,28 @@ class ArtifactManifestV1(ArtifactManifest):
             "contents": contents,
         }
 
+    def write_manifest_json(self, fp):
+        """Writes the manifest JSON to fp one entry at a time.
+
+        Produces the same document as to_manifest_json without building it in
+        memory, which matters for artifacts with millions of files.
+        """
+        fp.write('{\n    "version": %s,\n' % json.dumps(self.__class__.version()))
+        fp.write('    "storagePolicy": %s,\n' % json.dumps(self.storage_policy.name()))
+        fp.write(
+            '    "storagePolicyConfig": %s,\n'
+            % json.dumps(self.storage_policy.config() or {})
+        )
+        fp.write('    "contents": {')
+        sep = "\n"
+        for path in sorted(self.entries):
+            fp.write(
+                "%s        %s: %s"
+                % (sep, json.dumps(path), json.dumps(self.entries[path].to_json()))
+            )
+            sep = ",\n"
+        fp.write("\n    }\n}\n")
+
     def digest(self):
         hasher = hashlib.md5()
         hasher.update("wandb-artifact-manifest-v1\n".encode())
@@ -379,40 +680,6 @@ class ArtifactManifestV1(ArtifactManifest):
         return hasher.hexdigest()
 
 
-class ArtifactManifestEntry(object):
-    def __init__(
-        self,
-        path,
-        ref,
-        digest,
-        birth_artifact_id=None,
-        size=None,
-        extra=None,
-        local_path=None,
-    ):
-        if local_path is not None and size is None:
-            raise AssertionError(
-                "programming error, size required when local_path specified"
-            )
-        self.path = util.to_forward_slash_path(path)
-        self.ref = ref  # This is None for files stored in the artifact.
-        self.digest = digest
-        self.birth_artifact_id = birth_artifact_id
-        self.size = size
-        self.extra = extra or {}
-        # This is not stored in the manifest json, it's only used in the process
-        # of saving
-        self.local_path = local_path
-
-    def __repr__(self):
-        if self.ref is not None:
-            summary = "ref: %s/%s" % (self.ref, self.path)
-        else:
-            summary = "digest: %s" % self.digest
-
-        return "<ManifestEntry %s>" % summary
-
-
 class WandbStoragePolicy(StoragePolicy):
     @classmethod
     def name(cls):
@@ -456,16 +723,18 @@ class WandbStoragePolicy(StoragePolicy):
         )
         if hit:
             return path
-        response = self._session.get(
-            self._file_url(self._api, artifact.entity, manifest_entry),
-            auth=("api", self._api.api_key),
-            stream=True,
-        )
-        response.raise_for_status()
-
-        with open(path, "wb") as file:
-            for data in response.iter_content(chunk_size=16 * 1024):
-                file.write(data)
+        with self._cache.write_obj(
+            path, manifest_entry.size, resumable=True
+        ) as tmp_path:
+            if tmp_path is not None:
+                _download_url(
+                    self._session,
+                    self._file_url(self._api, artifact.entity, manifest_entry),
+                    tmp_path,
+                    manifest_entry.size,
+                    auth=("api", self._api.api_key),
+                    digest=manifest_entry.digest,
+                )
         return path
 
     def store_reference(
@@ -504,7 +773,9 @@ class WandbStoragePolicy(StoragePolicy):
         # write-through cache
         cache_path, hit = self._cache.check_md5_obj_path(entry.digest, entry.size)
         if not hit:
-            shutil.copyfile(entry.local_path, cache_path)
+            with self._cache.write_obj(cache_path, entry.size) as tmp_path:
+                if tmp_path is not None:
+                    shutil.copyfile(entry.local_path, tmp_path)
 
         resp = preparer.prepare(
             lambda: {
@@ -520,7 +791,8 @@ class WandbStoragePolicy(StoragePolicy):
         if not exists:
             with open(entry.local_path, "rb") as file:
                 # This fails if we don't send the first byte before the signed URL
-                # expires.
+                # expires. Resumable uploads (signed with x-goog-resumable) keep
+                # their session across retries and process restarts.
                 self._api.upload_file_retry(
                     resp.upload_url,
                     file,
@@ -530,6 +802,7 @@ class WandbStoragePolicy(StoragePolicy):
                         for header in (resp.upload_headers or {})
                     },
                 )
+        self._cache.unpin(entry.local_path, entry.path)
         return exists
 
 
@@ -657,6 +930,75 @@ class TrackingHandler(StorageHandler):
 
 DEFAULT_MAX_OBJECTS = 10000
 
+# Directories of a bucket prefix listed at once
+LIST_WORKERS = 16
+# How often listing a bucket prefix reports progress
+LIST_PROGRESS_SECONDS = 5
+
+
+def _list_objects_sharded(list_dir, prefix, max_objects):
+    """Yields up to max_objects objects under prefix, listing directories in parallel.
+
+    `list_dir(prefix, max_items)` yields the pages of a listing of prefix with a
+    "/" delimiter as (objects, subdirectory prefixes), stopping after max_items.
+    Objects are yielded as soon as their page is listed, so a huge directory
+    isn't listed past max_objects, with progress reported on long listings.
+    """
+    # Bounded so listings don't run ahead of the objects we're going to use
+    pages = queue.Queue(LIST_WORKERS)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def list_pages(prefix):
+        try:
+            for page in list_dir(prefix, max_objects):
+                if not put((page, None)):
+                    return
+        except Exception as e:
+            put((None, e))
+        # Tells the consumer this directory is done
+        put(None)
+
+    pool = multiprocessing.dummy.Pool(LIST_WORKERS)
+    pool.apply_async(list_pages, (prefix,))
+    listing = 1
+    count = 0
+    last_progress = time.time()
+    try:
+        while listing:
+            item = pages.get()
+            if item is None:
+                listing -= 1
+                continue
+            page, error = item
+            if error is not None:
+                raise error
+            objects, prefixes = page
+            for subprefix in prefixes:
+                pool.apply_async(list_pages, (subprefix,))
+                listing += 1
+            for obj in objects:
+                if count >= max_objects:
+                    return
+                yield obj
+                count += 1
+            if time.time() - last_progress > LIST_PROGRESS_SECONDS:
+                termlog("%i..." % count, newline=False, prefix=False)
+                last_progress = time.time()
+    finally:
+        # Directories still being listed stop after their current page
+        stop.set()
+        pool.terminate()
+        pool.join()
+
 
 class LocalFileHandler(StorageHandler):
     """Handles file:// references"""
@@ -694,8 +1036,9 @@ class LocalFileHandler(StorageHandler):
                 % (local_path, manifest_entry.digest, md5)
             )
 
-        util.mkdir_exists_ok(os.path.dirname(path))
-        shutil.copy(local_path, path)
+        with self._cache.write_obj(path, manifest_entry.size) as tmp_path:
+            if tmp_path is not None:
+                shutil.copy(local_path, tmp_path)
         return path
 
     def store_path(self, artifact, path, name=None, checksum=True, max_objects=None):
@@ -842,7 +1185,9 @@ class S3Handler(StorageHandler):
         if not local:
             return manifest_entry.ref
 
-        obj.download_file(path, ExtraArgs=extra_args)
+        with self._cache.write_obj(path, manifest_entry.size) as tmp_path:
+            if tmp_path is not None:
+                obj.download_file(tmp_path, ExtraArgs=extra_args)
         return path
 
     def store_path(self, artifact, path, name=None, checksum=True, max_objects=None):
@@ -867,9 +1212,10 @@ class S3Handler(StorageHandler):
                     newline=False,
                 )
                 objs = (
-                    self._s3.Bucket(bucket)
-                    .objects.filter(Prefix=key)
-                    .limit(max_objects)
+                    self._object_summary(bucket, item)
+                    for item in _list_objects_sharded(
+                        partial(self._list_dir, bucket), key, max_objects
+                    )
                 )
             else:
                 raise CommError(
@@ -893,6 +1239,24 @@ class S3Handler(StorageHandler):
             )
         return entries
 
+    def _list_dir(self, bucket, prefix, max_items):
+        # Clients are thread safe, unlike resources
+        paginator = self._s3.meta.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=bucket,
+            Prefix=prefix,
+            Delimiter="/",
+            PaginationConfig={"MaxItems": max_items},
+        ):
+            prefixes = [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+            yield page.get("Contents", []), prefixes
+
+    def _object_summary(self, bucket, item):
+        # What bucket.objects.filter() would have made from the listing
+        obj = self._s3.ObjectSummary(bucket, item["Key"])
+        obj.meta.data = item
+        return obj
+
     def _size_from_obj(self, obj):
         # ObjectSummary has size, Object has content_length
         if hasattr(obj, "size"):
@@ -1017,7 +1381,9 @@ class GCSHandler(StorageHandler):
         if not local:
             return manifest_entry.ref
 
-        obj.download_to_filename(path)
+        with self._cache.write_obj(path, manifest_entry.size) as tmp_path:
+            if tmp_path is not None:
+                obj.download_to_filename(tmp_path)
         return path
 
     def store_path(self, artifact, path, name=None, checksum=True, max_objects=None):
@@ -1037,8 +1403,8 @@ class GCSHandler(StorageHandler):
                 % (max_objects, key),
                 newline=False,
             )
-            objects = self._client.bucket(bucket).list_blobs(
-                prefix=key, max_results=max_objects
+            objects = _list_objects_sharded(
+                partial(self._list_dir, bucket), key, max_objects
             )
         else:
             objects = [obj]
@@ -1056,6 +1422,13 @@ class GCSHandler(StorageHandler):
             )
         return entries
 
+    def _list_dir(self, bucket, prefix, max_items):
+        blobs = self._client.bucket(bucket).list_blobs(
+            prefix=prefix, delimiter="/", max_results=max_items
+        )
+        for page in blobs.pages:
+            yield list(page), sorted(page.prefixes)
+
     def _entry_from_obj(self, obj, path, name=None, prefix="", multi=False):
         ref = path
         if name is None:
@@ -1118,9 +1491,20 @@ class HTTPHandler(StorageHandler):
                 % (manifest_entry.ref, manifest_entry.digest, digest)
             )
 
-        with open(path, "wb") as file:
-            for data in response.iter_content(chunk_size=16 * 1024):
-                file.write(data)
+        with self._cache.write_obj(
+            path, manifest_entry.size, resumable=True
+        ) as tmp_path:
+            if tmp_path is None:
+                # Another process downloaded it while we waited
+                response.close()
+            else:
+                _download_url(
+                    self._session,
+                    manifest_entry.ref,
+                    tmp_path,
+                    manifest_entry.size,
+                    response=response,
+                )
         return path
 
     def store_path(self, artifact, path, name=None, checksum=True, max_objects=None):
@@ -89,6 +89,9 @@ env_settings: Dict[str, Optional[str]] = dict(
     resume=None,
     silent=None,
     sagemaker_disable=None,
+    upload_bandwidth=None,
+    file_quiescence=None,
+    file_watcher=None,
     root_dir="WANDB_DIR",
     run_name="WANDB_NAME",
     run_notes="WANDB_NOTES",
@@ -326,6 +329,9 @@ class Settings(object):
         email=None,
         docker=None,
         sagemaker_disable: Optional[bool] = None,
+        upload_bandwidth=None,  # bytes per second, unlimited if not set
+        file_quiescence=None,  # seconds a file must be unchanged before upload
+        file_watcher=None,  # "inotify" to watch files with inotify on linux
         _start_time=None,
         _start_datetime=None,
         _cli_only_mode=None,  # avoid running any code specific for runs
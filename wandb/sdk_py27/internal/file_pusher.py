@@ -10,6 +10,7 @@ import wandb
 import wandb.util
 from wandb.compat import tempfile
 
+from wandb.filesync import bandwidth
 from wandb.filesync import stats
 from wandb.filesync import step_checksum
 from wandb.filesync import step_upload
@@ -50,7 +51,7 @@ class FilePusher(object):
 
     MAX_UPLOAD_JOBS = 64
 
-    def __init__(self, api, silent=False):
+    def __init__(self, api, silent=False, upload_bandwidth=None):
         self._api = api
 
         self._tempdir = tempfile.TemporaryDirectory("wandb")
@@ -60,12 +61,22 @@ class FilePusher(object):
         self._incoming_queue = queue.Queue()
         self._event_queue = queue.Queue()
 
+        # Content hash of the last uploaded version of each run file, used to
+        # skip re-uploading files that were touched but didn't change
+        self._upload_digests = {}
+
+        # Cap on upload throughput in bytes per second, shared by all jobs
+        self._bandwidth_limiter = bandwidth.TokenBucket(
+            int(float(upload_bandwidth)) if upload_bandwidth else None
+        )
+
         self._step_checksum = step_checksum.StepChecksum(
             self._api,
             self._tempdir,
             self._incoming_queue,
             self._event_queue,
             self._stats,
+            upload_digests=self._upload_digests,
         )
         self._step_checksum.start()
 
@@ -75,6 +86,8 @@ class FilePusher(object):
             self._event_queue,
             self.MAX_UPLOAD_JOBS,
             silent=silent,
+            upload_digests=self._upload_digests,
+            bandwidth_limiter=self._bandwidth_limiter,
         )
         self._step_upload.start()
 
@@ -4,6 +4,7 @@ from gql.client import RetryError  # type: ignore
 from gql.transport.requests import RequestsHTTPTransport  # type: ignore
 import datetime
 import ast
+import hashlib
 import os
 import json
 import yaml
@@ -12,6 +13,7 @@ import click
 import logging
 import requests
 import sys
+import time
 
 if os.name == "posix" and sys.version_info[0] < 3:
     import subprocess32 as subprocess  # type: ignore
@@ -20,6 +22,7 @@ else:
 
 import six
 from six import BytesIO
+from six.moves.urllib.parse import urlparse
 import wandb
 from wandb import __version__
 from wandb import env
@@ -52,6 +55,12 @@ class Api(object):
     """
 
     HTTP_TIMEOUT = env.get_http_timeout(10)
+    # Resumable uploads are sent in chunks of this size, GCS requires a multiple
+    # of 256KiB for every chunk but the last one.
+    UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+    # Number of times a single chunk is retried before we give up and let the
+    # outer retry loop resume the upload from the last committed byte.
+    UPLOAD_CHUNK_RETRIES = 5
 
     def __init__(
         self,
@@ -1192,6 +1201,8 @@ class Api(object):
             The requests library response object
         """
         extra_headers = extra_headers.copy()
+        if self._is_resumable_upload(extra_headers):
+            return self._upload_file_resumable(url, file, callback, extra_headers)
         response = None
         progress = Progress(file, callback=callback)
         if progress.len == 0:
@@ -1214,6 +1225,122 @@ class Api(object):
 
         return response
 
+    def _is_resumable_upload(self, extra_headers):
+        return any(
+            key.strip().lower() == "x-goog-resumable" and val.strip().lower() == "start"
+            for key, val in extra_headers.items()
+        )
+
+    def _upload_file_resumable(self, url, file, callback, extra_headers):
+        """Uploads a file in chunks using the resumable upload protocol
+
+        The session url we get back when initiating the upload is saved in the
+        cache dir, so a retry, or a new process uploading the same unchanged
+        file, continues from the last chunk the server acknowledged instead of
+        starting over.
+        """
+        progress = Progress(file, callback=callback)
+        if progress.len == 0:
+            raise CommError("%s is an empty file" % file.name)
+        session_path = self._upload_session_path(url, file)
+        session_url = None
+        offset = 0
+        if os.path.isfile(session_path):
+            with open(session_path) as f:
+                session_url = json.load(f).get("session_url")
+            offset = self._resumable_offset(session_url, progress.len)
+            if offset is None:
+                # The session expired or was cancelled, start a new one.
+                session_url = None
+                offset = 0
+        if session_url is None:
+            extra_headers["Content-Length"] = "0"
+            response = requests.post(url, headers=extra_headers)
+            response.raise_for_status()
+            session_url = response.headers["Location"]
+            util.mkdir_exists_ok(os.path.dirname(session_path))
+            with open(session_path, "w") as f:
+                json.dump({"session_url": session_url}, f)
+
+        failures = 0
+        while offset < progress.len:
+            progress.seek(offset)
+            chunk = progress.read(self.UPLOAD_CHUNK_SIZE)
+            content_range = "bytes %i-%i/%i" % (
+                offset,
+                offset + len(chunk) - 1,
+                progress.len,
+            )
+            try:
+                response = requests.put(
+                    session_url, data=chunk, headers={"Content-Range": content_range}
+                )
+                response.raise_for_status()
+                offset = self._resumable_committed(response, progress.len)
+                failures = 0
+            except requests.exceptions.RequestException as e:
+                logger.error("upload_file chunk exception {} {}".format(url, e))
+                failures += 1
+                status_code = e.response.status_code if e.response is not None else 0
+                transient = status_code in (408, 429, 500, 502, 503, 504) or isinstance(
+                    e,
+                    (requests.exceptions.Timeout, requests.exceptions.ConnectionError),
+                )
+                if not transient:
+                    # The session can't be resumed past this error
+                    os.remove(session_path)
+                    util.sentry_reraise(e)
+                if failures > self.UPLOAD_CHUNK_RETRIES:
+                    # The session is kept on disk, the next attempt resumes it
+                    util.sentry_reraise(retry.TransientException(exc=e))
+                time.sleep(min(2 ** failures, 60))
+                committed = self._resumable_offset(session_url, progress.len)
+                if committed is None:
+                    os.remove(session_path)
+                    util.sentry_reraise(retry.TransientException(exc=e))
+                offset = committed
+
+        os.remove(session_path)
+        return response
+
+    def _upload_session_path(self, url, file):
+        stat = os.fstat(file.fileno())
+        key = "{}:{}:{}:{}".format(
+            urlparse(url).path,
+            os.path.abspath(getattr(file, "name", "")),
+            stat.st_size,
+            stat.st_mtime,
+        )
+        return os.path.join(
+            env.get_cache_dir(),
+            "uploads",
+            hashlib.md5(key.encode("utf-8")).hexdigest() + ".json",
+        )
+
+    def _resumable_offset(self, session_url, length):
+        """Returns how many bytes the server has committed, None if the session is gone
+
+        Raises TransientException if the server can't tell us, the session is
+        kept so the next attempt asks again.
+        """
+        try:
+            response = self._status_request(session_url, length)
+            if response.status_code in (404, 410):
+                return None
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            util.sentry_reraise(retry.TransientException(exc=e))
+        return self._resumable_committed(response, length)
+
+    def _resumable_committed(self, response, length):
+        if response.status_code in (200, 201):
+            return length
+        # 308 Resume Incomplete, the Range header is missing if no bytes were committed
+        committed = response.headers.get("Range")
+        if not committed:
+            return 0
+        return int(committed.split("-")[-1]) + 1
+
     @normalize_exceptions
     def register_agent(self, host, sweep_id=None, project_name=None, entity=None):
         """Register a new agent
@@ -44,6 +44,12 @@ class Progress(object):
         self.callback(len(bites), self.bytes_read)
         return bites
 
+    def seek(self, offset):
+        """Continue reading from offset, used to resume partial uploads"""
+        self.file.seek(offset)
+        self.bytes_read = offset
+        self.callback(0, self.bytes_read)
+
     def rewind(self):
         self.callback(0, -self.bytes_read)
         self.bytes_read = 0
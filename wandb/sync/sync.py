@@ -100,6 +100,9 @@ class SyncThread(threading.Thread):
                 save_code=None,
                 email=None,
                 silent=None,
+                upload_bandwidth=None,
+                file_quiescence=None,
+                file_watcher=None,
             )
             settings = settings_static.SettingsStatic(sd)
             record_q = queue.Queue()
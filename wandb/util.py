@@ -15,6 +15,7 @@ import math
 import os
 import re
 import shlex
+import shutil
 import subprocess
 import sys
 import threading
@@ -647,6 +648,178 @@ def mkdir_exists_ok(path):
             raise
 
 
+# ioctl request number of FICLONE from linux/fs.h
+_FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    """Creates dst as a copy-on-write clone of src.
+
+    The clone shares data blocks with src until either of them is written to, so
+    it's instant regardless of the file size. Raises OSError if the platform or
+    the filesystem (only btrfs, xfs, ocfs2, ... support it) can't clone files.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.ENOTSUP, "reflinks aren't supported on this platform")
+    with open(src, "rb") as src_file:
+        with open(dst, "wb") as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+                return
+            except (IOError, OSError):
+                pass
+    os.remove(dst)
+    raise OSError(errno.ENOTSUP, "reflinks aren't supported for %s" % dst)
+
+
+def _copy_file_range(src, dst):
+    with open(src, "rb") as src_file:
+        with open(dst, "wb") as dst_file:
+            size = os.fstat(src_file.fileno()).st_size
+            copied = 0
+            while copied < size:
+                n = os.copy_file_range(  # type: ignore
+                    src_file.fileno(), dst_file.fileno(), size - copied
+                )
+                if n == 0:
+                    break
+                copied += n
+
+
+def snapshot_file(src, dst):
+    """Copies src to dst along with its metadata as cheaply as the OS allows.
+
+    We try a copy-on-write clone first, then an in-kernel copy and only read
+    the file through python as a last resort.
+
+    Returns:
+        The strategy used, one of "reflink", "copy_file_range" or "copy".
+    """
+    try:
+        reflink(src, dst)
+        strategy = "reflink"
+    except OSError:
+        strategy = "copy"
+        if hasattr(os, "copy_file_range"):
+            try:
+                _copy_file_range(src, dst)
+                strategy = "copy_file_range"
+            except OSError:
+                pass
+        if strategy == "copy":
+            shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+    return strategy
+
+
+LINK_MODES = ("auto", "reflink", "hardlink", "symlink", "copy")
+
+
+def _make_read_only(path):
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _copy_times(src, dst):
+    src_stat = os.stat(src)
+    os.utime(dst, (src_stat.st_atime, src_stat.st_mtime))
+
+
+def materialize_file(src, dst, mode="auto"):
+    """Makes dst a file with the contents of src, without copying it if possible.
+
+    Hardlinks and symlinks share src itself, so src is made read-only to keep
+    edits through dst from changing it; they are only used when asked for.
+    "auto" tries a reflink and falls back to a copy, both leave dst writable.
+    dst is replaced atomically if it exists, never written through, and gets
+    the mtime of src.
+
+    Returns:
+        The strategy used, one of "reflink", "hardlink", "symlink" or "copy".
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(
+            "Unknown link mode %s, expected one of %s" % (mode, LINK_MODES)
+        )
+    tmp_path = "%s.%s.tmp" % (dst, generate_id())
+    try:
+        strategy = _materialize_new_file(src, tmp_path, mode)
+        if hasattr(os, "replace"):
+            os.replace(tmp_path, dst)
+        else:  # python 2, rename already replaces dst on posix
+            os.rename(tmp_path, dst)
+    finally:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+    return strategy
+
+
+def _materialize_new_file(src, dst, mode):
+    if mode in ("auto", "reflink"):
+        try:
+            reflink(src, dst)
+            _copy_times(src, dst)
+            return "reflink"
+        except OSError:
+            if mode == "reflink":
+                raise
+    if mode == "hardlink":
+        os.link(src, dst)
+        _make_read_only(src)
+        return "hardlink"
+    if mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        _make_read_only(src)
+        return "symlink"
+    # src may be read-only because of earlier links, its copies shouldn't be
+    shutil.copyfile(src, dst)
+    _copy_times(src, dst)
+    return "copy"
+
+
+def scan_files(root, follow_symlinks=False, onerror=None):
+    """Yields (path, stat) for every file under root, like os.walk.
+
+    Uses os.scandir where available so listing a directory doesn't need an
+    extra stat call per entry. Entries that disappear or can't be read are
+    passed to `onerror` if given, otherwise they are logged and skipped.
+    """
+    if onerror is None:
+
+        def onerror(e):
+            logger.warning("couldn't scan %s: %s", e.filename, e)
+
+    if not hasattr(os, "scandir"):
+        for dirpath, _, filenames in os.walk(
+            root, onerror=onerror, followlinks=follow_symlinks
+        ):
+            for fname in filenames:
+                path = os.path.join(dirpath, fname)
+                try:
+                    yield path, os.stat(path)
+                except OSError as e:
+                    onerror(e)
+        return
+    dirs = [root]
+    while dirs:
+        try:
+            entries = list(os.scandir(dirs.pop()))  # type: ignore
+        except OSError as e:
+            onerror(e)
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if follow_symlinks or not entry.is_symlink():
+                        dirs.append(entry.path)
+                    continue
+                yield entry.path, entry.stat()
+            except OSError as e:
+                onerror(e)
+
+
 def no_retry_auth(e):
     if hasattr(e, "exception"):
         e = e.exception
@@ -777,7 +950,9 @@ def has_num(dictionary, key):
 def md5_file(path):
     hash_md5 = hashlib.md5()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        # hashlib releases the GIL for large buffers, so big reads let other
+        # threads make progress while we hash
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
             hash_md5.update(chunk)
     return base64.b64encode(hash_md5.digest()).decode("ascii")
 
@@ -1016,6 +1191,15 @@ def sizeof_fmt(num, suffix="B"):
     return "%.1f%s%s" % (num, "Yi", suffix)
 
 
+def parse_size(size):
+    """Parses a size in bytes like "500MB" or "1.5GiB", units are powers of 1024."""
+    match = re.match(r"^\s*([0-9.]+)\s*([kmgtp]?)i?b?\s*$", str(size), re.IGNORECASE)
+    if match is None:
+        raise ValueError("Invalid size: %s" % size)
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " kmgtp".index(unit.lower() or " "))
+
+
 def auto_project_name(program):
     # if we're in git, set project name to git repo name + relative path within repo
     root_dir = wandb.wandb_sdk.lib.git.GitRepo().root_dir